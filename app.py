@@ -1,8 +1,41 @@
 import streamlit as st
-import boto3
-from botocore.exceptions import ClientError
-import json
-from bedrock_utils import query_knowledge_base, generate_response, valid_prompt
+import os
+import time
+from bedrock_utils import (FAST_MODEL, classify_and_retrieve, classification_cache, embed_text,
+                           generate_response_stream, retrieve_hedger, route_model, token_usage)
+from context_packing import pack_context
+from conversation import ConversationMemory
+from rate_limit import rate_limits
+from spec_index import load_index
+import tracing
+
+
+def remember_generation(result):
+    # Called by generate_response_stream once the stream has finished.
+    st.session_state.last_generation_result = result
+    st.session_state.last_generation = {
+        'input tokens': result.input_tokens,
+        'output tokens': result.output_tokens,
+        'stop reason': result.stop_reason,
+        'model latency ms': result.model_latency_ms,
+        'first token ms': round(result.first_token_s * 1000) if result.first_token_s is not None else None,
+    }
+
+
+# Streamlit re-executes this script on every interaction, so anything expensive
+# is built lazily, once per server process, through st.cache_resource.
+@st.cache_resource
+def get_answer_cache():
+    # Imported here so NumPy is only loaded once the cache is actually needed.
+    from semantic_cache import SemanticCache
+    threshold = float(os.environ.get("BEDROCK_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    return SemanticCache(embed_text, threshold=threshold)
+
+
+@st.cache_resource
+def get_spec_index():
+    # Loads .kb_state/spec_index.json, rebuilding it first if the spec sheets are newer.
+    return load_index()
 
 
 # Streamlit UI
@@ -10,15 +43,75 @@ st.title("Bedrock Chat Application")
 
 # Sidebar for configurations
 st.sidebar.header("Configuration")
-model_id = st.sidebar.selectbox("Select LLM Model", ["anthropic.claude-3-haiku-20240307-v1:0", "anthropic.claude-3-5-sonnet-20240620-v1:0"])
+AUTO_MODEL = "Auto (route per question)"
+model_choice = st.sidebar.selectbox("Select LLM Model", [AUTO_MODEL, "anthropic.claude-3-haiku-20240307-v1:0", "anthropic.claude-3-5-sonnet-20240620-v1:0"])
+# In Auto mode the fast model classifies and summarizes; each answer's model is routed per question.
+auto_route = model_choice == AUTO_MODEL
+model_id = FAST_MODEL if auto_route else model_choice
 # Default the KB ID to the one you created; you can override in the sidebar if desired.
 kb_id = st.sidebar.text_input("Knowledge Base ID", "9HOYRJWGB7")
 temperature = st.sidebar.select_slider("Temperature", [i/10 for i in range(0,11)],1)
 top_p = st.sidebar.select_slider("Top_P", [i/1000 for i in range(0,1001)], 1)
+use_answer_cache = st.sidebar.checkbox("Reuse answers to similar questions", True)
+use_spec_index = st.sidebar.checkbox("Answer exact spec lookups locally", True)
+show_trace = st.sidebar.checkbox("Trace chat turns", tracing.is_local())
+if show_trace and isinstance(tracing.get_tracer(), tracing.NoopTracer):
+    # Switch the default no-op tracer to the in-process one; an OpenTelemetry tracer is left alone.
+    tracing.configure("local")
 
-# Initialize chat history
+# Initialize chat history; `memory` is what the model sees of earlier turns
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory()
+memory = st.session_state.memory
+
+if st.sidebar.button("New conversation"):
+    st.session_state.messages = []
+    memory.clear()
+
+# Per-stage timings of the most recent turn
+if st.session_state.get("last_timings"):
+    with st.sidebar.expander("Last turn timings"):
+        for stage, seconds in st.session_state.last_timings.items():
+            st.write(f"{stage}: {seconds * 1000:.0f} ms")
+        stats = classification_cache.stats()
+        st.write(f"classification cache: {stats['hits']} hits / {stats['misses']} misses")
+        if use_spec_index:
+            stats = get_spec_index().stats()
+            st.write(f"spec index: {stats['hits']} hits / {stats['misses']} misses ({stats['records']} records)")
+        if use_answer_cache:
+            stats = get_answer_cache().stats()
+            st.write(f"answer cache: {stats['hits']} hits / {stats['misses']} misses")
+        route = st.session_state.get("last_route")
+        if auto_route and route:
+            st.write("route: " + ", ".join(f"{k} {v}" for k, v in route.items()))
+        context_stats = st.session_state.get("last_context_stats")
+        if context_stats:
+            st.write("context: " + ", ".join(f"{k} {v}" for k, v in context_stats.items()))
+        generation = st.session_state.get("last_generation")
+        if generation:
+            st.write("generation: " + ", ".join(f"{k} {v}" for k, v in generation.items() if v is not None))
+        usage = token_usage.stats()
+        st.write(f"prompt cache: {usage['cache_read_input_tokens']} read / "
+                 f"{usage['cache_creation_input_tokens']} written / {usage['input_tokens']} uncached tokens")
+        limits = rate_limits.stats().get(model_id)
+        if limits:
+            st.write(f"rate limiter: concurrency {limits['limit']}, queued {limits['queued']} "
+                     f"(max {limits['max_queued']}), mean wait {limits['wait_s_mean'] * 1000:.0f} ms, "
+                     f"{limits['throttles']} throttles")
+        if retrieve_hedger.enabled:
+            stats = retrieve_hedger.stats()
+            st.write(f"retrieve hedging: {stats['hedged']} hedged / {stats['calls']} calls, "
+                     f"{stats['hedge_wins']} won")
+        st.write("conversation: " + ", ".join(f"{k} {v}" for k, v in memory.stats().items()))
+
+# Span breakdown of the most recent turn
+if show_trace and tracing.is_local() and st.session_state.get("last_trace_id"):
+    with st.sidebar.expander("Last turn trace"):
+        for depth, span in tracing.span_tree(tracing.recent_traces.trace(st.session_state.last_trace_id)):
+            marker = " (error)" if span["status"] == "ERROR" else ""
+            st.text(f"{'  ' * depth}{span['name']}: {span['duration_ms']:.0f} ms{marker}")
 
 # Display chat messages
 for message in st.session_state.messages:
@@ -31,56 +124,124 @@ if prompt := st.chat_input("What would you like to know?"):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    if valid_prompt(prompt, model_id):
-        # Query Knowledge Base
-        kb_results = query_knowledge_base(prompt, kb_id)
-        
-        # Prepare context from Knowledge Base results (handle multiple retrieval shapes)
-        context_pieces = []
-        for result in (kb_results or []):
-            text_piece = None
-            if isinstance(result, dict):
-                # common normalized form: {'text': '...'}
-                if 'text' in result and isinstance(result['text'], str):
-                    text_piece = result['text']
-                # Bedrock Agent format: {'content': {'text': '...'}} or {'content': [{'text': '...'}]}
-                elif 'content' in result:
-                    content = result['content']
-                    if isinstance(content, dict) and 'text' in content and isinstance(content['text'], str):
-                        text_piece = content['text']
-                    elif isinstance(content, list):
-                        for item in content:
-                            if isinstance(item, dict) and 'text' in item and isinstance(item['text'], str):
-                                text_piece = item['text']
-                                break
-                # fallback shapes
-                elif 'chunks' in result and isinstance(result['chunks'], str):
-                    text_piece = result['chunks']
-                elif 'preview' in result and isinstance(result['preview'], str):
-                    text_piece = result['preview']
-            # last resort: stringify
-            if not text_piece:
-                try:
-                    text_piece = json.dumps(result)
-                except Exception:
-                    text_piece = str(result)
-            if text_piece:
-                # keep pieces reasonably sized
-                if len(text_piece) > 5000:
-                    text_piece = text_piece[:5000] + "\n...[truncated]"
-                context_pieces.append(text_piece)
-
-        context = "\n".join(context_pieces)
-        if len(context) > 15000:
-            context = context[:15000] + "\n...[truncated]"
-        
-        # Generate response using LLM
-        full_prompt = f"Context: {context}\n\nUser: {prompt}\n\n"
-        response = generate_response(full_prompt, model_id, temperature, top_p)
-    else:
-        response = "I'm unable to answer this, please try again"
-    
-    # Display assistant response
-    with st.chat_message("assistant"):
-        st.markdown(response)
-    st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+    tracer = tracing.get_tracer()
+    with tracer.start_as_current_span("chat.turn", attributes={"gen_ai.request.model": model_id}):
+        st.session_state.last_trace_id = tracing.current_trace_id()
+        # Short follow-ups ("and its weight?") are retrieved and cached together with
+        # the previous question, but always classified on their own.
+        query = memory.standalone_query(prompt)
+        follow_up = query != prompt
+
+        timings = {}
+        cached_answer = None
+        # An exact spec lookup ("fuel tank size of the MC750") is answered from the
+        # spec tables without any Bedrock call. The prompt names the attribute; the
+        # standalone query only supplies the model for follow-ups.
+        if use_spec_index:
+            lookup_start = time.perf_counter()
+            with tracer.start_as_current_span("spec_index.lookup") as span:
+                spec_answer = get_spec_index().resolve(prompt, context=query)
+                span.set_attribute("spec.hit", spec_answer is not None)
+            timings['spec_lookup'] = time.perf_counter() - lookup_start
+            if spec_answer is not None:
+                cached_answer = spec_answer.answer
+
+        # A previously answered, semantically similar question short-circuits the whole
+        # pipeline. A follow-up's query carries an earlier, accepted question, so its
+        # lookup waits until the prompt itself has passed classification.
+        answer_cache = get_answer_cache() if use_answer_cache else None
+
+        def lookup_cached_answer():
+            lookup_start = time.perf_counter()
+            with tracer.start_as_current_span("answer_cache.lookup") as span:
+                answer = answer_cache.lookup(query, kb_id)
+                span.set_attribute("cache.hit", answer is not None)
+            timings['answer_cache'] = time.perf_counter() - lookup_start
+            return answer
+
+        if answer_cache is not None and cached_answer is None and not follow_up:
+            cached_answer = lookup_cached_answer()
+
+        if cached_answer is not None:
+            response = cached_answer
+            memory.add_exchange(prompt, response)
+            with st.chat_message("assistant"):
+                st.markdown(response)
+        else:
+            # Classify the prompt and query the Knowledge Base concurrently
+            with tracer.start_as_current_span("classify_and_retrieve"):
+                turn = classify_and_retrieve(prompt, model_id, kb_id, retrieval_query=query)
+            timings.update(turn['timings'])
+            if turn['accepted'] and follow_up and answer_cache is not None:
+                cached_answer = lookup_cached_answer()
+
+            if cached_answer is not None:
+                response = cached_answer
+                memory.add_exchange(prompt, response)
+                with st.chat_message("assistant"):
+                    st.markdown(response)
+            elif turn['accepted']:
+                answer_model = model_id
+                if auto_route:
+                    decision = route_model(query, turn['classification'], turn['results'])
+                    answer_model = decision.model_id
+                    st.session_state.last_route = {
+                        'model': answer_model.split('.', 1)[-1],
+                        'score': decision.score,
+                        'reasons': ", ".join(decision.reasons) or "none",
+                    }
+
+                # Pack the most relevant, de-duplicated chunks into the model's token budget
+                assembly_start = time.perf_counter()
+                with tracer.start_as_current_span("context.pack") as span:
+                    packed = pack_context(turn['results'], answer_model)
+                    span.set_attributes({"context.tokens": packed.used_tokens,
+                                         "context.chunks": len(packed.included)})
+                timings['context'] = time.perf_counter() - assembly_start
+                context = packed.text
+                st.session_state.last_context_stats = {
+                    'tokens': packed.used_tokens,
+                    'budget': packed.budget_tokens,
+                    'chunks': len(packed.included),
+                    'duplicates dropped': packed.dropped_duplicates,
+                    'over budget': packed.dropped_over_budget,
+                }
+
+                # Generate response using LLM, rendering tokens as they arrive. The
+                # system prompt runs from most to least stable (context, then the
+                # conversation summary) so repeated prefixes hit the prompt cache.
+                system = [f"Context: {context}", memory.system_prompt()]
+                # The render span covers the model stream plus Streamlit drawing it.
+                with st.chat_message("assistant"), tracer.start_as_current_span("render.stream"):
+                    generate_start = time.perf_counter()
+                    st.session_state.last_generation_result = None
+                    response = st.write_stream(generate_response_stream(
+                        prompt, answer_model, temperature, top_p,
+                        history=memory.history(), system=system, on_result=remember_generation))
+                    timings['generate'] = time.perf_counter() - generate_start
+                    result = st.session_state.last_generation_result
+                    if not response:
+                        response = "Sorry, I couldn't generate a response. Please try again."
+                        st.markdown(response)
+                    elif result is not None and result.error is None and result.stop_reason != 'max_tokens':
+                        # Only complete answers are remembered and reused; a stream cut off by
+                        # an error or the token limit stays on screen but goes no further.
+                        memory.add_exchange(prompt, response)
+                        if answer_cache is not None:
+                            answer_cache.store(query, response, kb_id)
+            else:
+                response = "I'm unable to answer this, please try again"
+                # Display assistant response
+                with st.chat_message("assistant"):
+                    st.markdown(response)
+
+        st.session_state.messages.append({"role": "assistant", "content": response})
+
+        # Fold older turns into the rolling summary once the answer is on screen
+        summarize_start = time.perf_counter()
+        with tracer.start_as_current_span("memory.compact") as span:
+            compacted = memory.compact_if_needed(model_id)
+            span.set_attribute("memory.compacted", compacted)
+        if compacted:
+            timings['summarize'] = time.perf_counter() - summarize_start
+        st.session_state.last_timings = timings
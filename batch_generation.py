@@ -0,0 +1,127 @@
+"""Bulk answer generation for large sets of stored questions.
+
+Two modes share the payload builders and response parsing of
+`bedrock_utils.generate_response`:
+
+- On-demand: `generate_batch` fans prompts out over a bounded worker pool,
+  rate-limited by `rate_limit`, calling `invoke_model`.
+- Batch inference: `write_batch_input` writes the JSONL records a Bedrock
+  batch inference job expects, `submit_batch_job` starts the job,
+  `wait_for_batch_job` polls it and `stream_batch_results` reads the output
+  back from S3 line by line.
+
+Every function takes optional client arguments so it can run against a local fake.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bedrock_clients import get_client
+from bedrock_utils import build_payload, extract_text, invoke_payload
+from rate_limit import ModelLimiter, limiter_for
+
+# Terminal states reported by get_model_invocation_job.
+TERMINAL_JOB_STATES = ('Completed', 'PartiallyCompleted', 'Failed', 'Stopped', 'Expired')
+
+
+def generate_batch(prompts: List[str], model_id: str, temperature: float = 0.0, top_p: float = 1.0,
+                   max_tokens: int = 512, max_workers: int = 8, requests_per_minute: Optional[float] = None,
+                   max_retries: int = 5, client: Any = None) -> List[Optional[str]]:
+    """Generate answers for `prompts` concurrently; results come back in input order.
+
+    Calls go through the model's shared rate limiter, or through a dedicated
+    one when `requests_per_minute` is given. Throttled calls are retried with
+    jittered exponential backoff; prompts that still fail yield None, like
+    `generate_response`. Each call's usage and latency go to the metrics sink.
+    """
+    if requests_per_minute:
+        limiter = ModelLimiter(f'bulk:{model_id}', rpm=requests_per_minute, max_concurrency=max_workers)
+    else:
+        limiter = limiter_for(model_id)
+
+    def run_one(prompt: str) -> Optional[str]:
+        payload = build_payload(prompt, model_id, temperature, top_p, max_tokens)
+        return invoke_payload(payload, model_id, client=client, limiter=limiter, max_retries=max_retries).text
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='bulk-generate') as pool:
+        return list(pool.map(run_one, prompts))
+
+
+def write_batch_input(records: Iterable[Tuple[str, str]], path: str, model_id: str, temperature: float = 0.0,
+                      top_p: float = 1.0, max_tokens: int = 512) -> int:
+    """Write (record_id, prompt) pairs as batch-inference JSONL; returns the record count.
+
+    Each line is {"recordId": ..., "modelInput": <invoke_model payload>}.
+    Bedrock requires a minimum number of records per job (100 at the time of writing).
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record_id, prompt in records:
+            payload = build_payload(prompt, model_id, temperature, top_p, max_tokens)
+            f.write(json.dumps({'recordId': str(record_id), 'modelInput': payload}) + '\n')
+            count += 1
+    return count
+
+
+def submit_batch_job(input_s3_uri: str, output_s3_uri: str, model_id: str, role_arn: str,
+                     job_name: Optional[str] = None, client: Any = None) -> str:
+    """Start a Bedrock batch inference job and return its ARN."""
+    client = client or get_client('bedrock')
+    response = client.create_model_invocation_job(
+        jobName=job_name or f'bulk-generate-{int(time.time())}',
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={'s3InputDataConfig': {'s3Uri': input_s3_uri, 's3InputFormat': 'JSONL'}},
+        outputDataConfig={'s3OutputDataConfig': {'s3Uri': output_s3_uri}},
+    )
+    return response['jobArn']
+
+
+def wait_for_batch_job(job_arn: str, poll_interval: float = 60.0, timeout: Optional[float] = None,
+                       client: Any = None) -> Dict[str, Any]:
+    """Poll a batch inference job until it reaches a terminal state; returns the job description."""
+    client = client or get_client('bedrock')
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        job = client.get_model_invocation_job(jobIdentifier=job_arn)
+        if job.get('status') in TERMINAL_JOB_STATES:
+            return job
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f'Batch job {job_arn} still {job.get("status")} after {timeout}s')
+        time.sleep(poll_interval)
+
+
+def _split_s3_uri(uri: str) -> Tuple[str, str]:
+    without_scheme = uri[len('s3://'):] if uri.startswith('s3://') else uri
+    bucket, _, key = without_scheme.partition('/')
+    return bucket, key
+
+
+def stream_batch_results(output_s3_uri: str, job_arn: str, s3_client: Any = None) -> Iterator[Dict[str, Any]]:
+    """Yield {'recordId', 'text', 'error'} for each output record of a finished job.
+
+    Bedrock writes results under <output_s3_uri>/<job id>/ as `*.jsonl.out`
+    files; they are read line by line rather than downloaded whole.
+    """
+    s3_client = s3_client or get_client('s3')
+    bucket, prefix = _split_s3_uri(output_s3_uri)
+    job_id = job_arn.rsplit('/', 1)[-1]
+    prefix = f"{prefix.rstrip('/')}/{job_id}/" if prefix else f'{job_id}/'
+
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if not obj['Key'].endswith('.jsonl.out'):
+                continue
+            body = s3_client.get_object(Bucket=bucket, Key=obj['Key'])['Body']
+            for line in body.iter_lines():
+                if not line:
+                    continue
+                row = json.loads(line)
+                output = row.get('modelOutput')
+                yield {
+                    'recordId': row.get('recordId'),
+                    'text': extract_text(output) if output is not None else None,
+                    'error': row.get('error'),
+                }
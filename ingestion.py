@@ -0,0 +1,224 @@
+"""Local PDF text extraction and table-aware chunking for the spec sheets.
+
+`iter_pdf_pages` yields one page of text at a time (pypdf parses pages
+lazily), and `chunk_pages` turns that page stream into chunks of at most
+`max_tokens` (approximate, see `context_packing.estimate_tokens`) without
+holding the whole document in memory.
+
+Spec sheets mix prose with spec tables, which pypdf flattens into
+"Label: value" lines under upper-case section headings ("ENGINE",
+"WEIGHTS", ...). Chunking keeps each table together with its heading: a
+table that does not fit in the current chunk starts a new one, and a table
+longer than a whole chunk is split between rows with the heading repeated.
+A prose line longer than a whole chunk (a paragraph the PDF did not wrap) is
+split between sentences, or between words for an over-long sentence. Prose
+chunks overlap by up to `overlap_tokens` of trailing lines; table rows are
+never repeated as overlap.
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from context_packing import estimate_tokens
+
+DEFAULT_CHUNK_TOKENS = 300
+DEFAULT_OVERLAP_TOKENS = 45
+
+# "Net Power (SAE J1349): 634 kW (850 hp)": a short label, then a numeric or short value.
+_ROW_RE = re.compile(r'^(?P<label>[A-Z][^:]{0,60}?):\s+(?P<value>\S.*)$')
+_MAX_ROW_VALUE = 30
+_PARENS_RE = re.compile(r'\([^)]*\)')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?;])\s+')
+
+
+@dataclass
+class Chunk:
+    text: str
+    section: str
+    page_start: int
+    page_end: int
+    has_table: bool
+    tokens: int
+
+
+@dataclass
+class _Unit:
+    kind: str  # 'heading' | 'table' | 'text'
+    section: str
+    lines: List[str]
+    page: int
+    tokens: int
+
+
+def fix_mojibake(text: str) -> str:
+    """Undo UTF-8 text that was decoded as cp1252 ("mÂ³" -> "m³"); leaves other text alone."""
+    if 'Â' not in text and 'â' not in text:
+        return text
+    try:
+        return text.encode('cp1252').decode('utf-8')
+    except UnicodeError:
+        return text
+
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """Yield the extracted text of each page of the PDF at `path`."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for page in reader.pages:
+        yield fix_mojibake(page.extract_text() or '')
+
+
+def is_heading(line: str) -> bool:
+    # "DIMENSIONS (with SU Blade and Single-Shank Ripper)" is still a heading.
+    letters = [c for c in _PARENS_RE.sub('', line) if c.isalpha()]
+    return len(line) <= 80 and len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def parse_row(line: str) -> Optional[Tuple[str, str]]:
+    """Return (label, value) if `line` looks like a spec-table row."""
+    match = _ROW_RE.match(line)
+    if not match:
+        return None
+    value = match.group('value').strip()
+    if len(value) > _MAX_ROW_VALUE and not value[0].isdigit():
+        return None
+    return match.group('label').strip(), value
+
+
+def iter_lines(pages: Iterable[str]) -> Iterator[Tuple[int, str, str, str]]:
+    """Yield (page number from 1, kind, section, line) for every non-empty line.
+
+    Consecutive heading lines (headings wrapped by the PDF layout) are merged
+    into one heading, which becomes the section of the lines that follow.
+    """
+    section = ''
+    pending: List[str] = []
+    pending_page = 1
+    for page_no, text in enumerate(pages, 1):
+        for raw in text.splitlines():
+            line = ' '.join(raw.split())
+            if not line:
+                continue
+            if is_heading(line) and parse_row(line) is None:
+                if not pending:
+                    pending_page = page_no
+                pending.append(line)
+                continue
+            if pending:
+                section = ' '.join(pending)
+                yield pending_page, 'heading', section, section
+                pending = []
+            yield page_no, 'table' if parse_row(line) else 'text', section, line
+    if pending:
+        section = ' '.join(pending)
+        yield pending_page, 'heading', section, section
+
+
+def split_line(line: str, max_tokens: int) -> List[str]:
+    """Split `line` into pieces of at most `max_tokens`, between sentences where possible.
+
+    A sentence longer than `max_tokens` is split between words; a single word
+    longer than that is left whole.
+    """
+    pieces: List[str] = []
+    words: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_END_RE.split(line):
+        parts = [sentence] if estimate_tokens(sentence) <= max_tokens else sentence.split(' ')
+        for part in parts:
+            tokens = estimate_tokens(part)
+            if words and used + tokens > max_tokens:
+                pieces.append(' '.join(words))
+                words, used = [], 0
+            words.append(part)
+            used += tokens
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
+
+
+def _units(lines: Iterable[Tuple[int, str, str, str]]) -> Iterator[_Unit]:
+    """Group consecutive rows of one section into a single table unit; other lines stay single."""
+    table: Optional[_Unit] = None
+    for page, kind, section, line in lines:
+        if kind == 'table' and table is not None and table.section == section:
+            table.lines.append(line)
+            table.tokens += estimate_tokens(line)
+            continue
+        if table is not None:
+            yield table
+            table = None
+        unit = _Unit(kind, section, [line], page, estimate_tokens(line))
+        if kind == 'table':
+            table = unit
+        else:
+            yield unit
+    if table is not None:
+        yield table
+
+
+def chunk_pages(pages: Iterable[str], max_tokens: int = DEFAULT_CHUNK_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """Yield table-aware chunks for a stream of page texts; see the module docstring."""
+    # Current chunk: (kind, line, tokens, page) per line.
+    current: List[Tuple[str, str, int, int]] = []
+    section = ''
+
+    def emit() -> Chunk:
+        return Chunk(
+            text='\n'.join(line for _, line, _, _ in current),
+            section=section,
+            page_start=current[0][3],
+            page_end=current[-1][3],
+            has_table=any(kind == 'table' for kind, _, _, _ in current),
+            tokens=sum(tokens for _, _, tokens, _ in current),
+        )
+
+    def used() -> int:
+        return sum(tokens for _, _, tokens, _ in current)
+
+    for unit in _units(iter_lines(pages)):
+        if not current:
+            section = unit.section
+        if unit.kind == 'table':
+            if current and used() + unit.tokens > max_tokens:
+                # Start the table in a fresh chunk, taking its heading along.
+                carry = []
+                while current and current[-1][0] == 'heading':
+                    carry.insert(0, current.pop())
+                if current:
+                    yield emit()
+                current = carry
+                section = unit.section
+            heading = [('heading', unit.section, estimate_tokens(unit.section), unit.page)] if unit.section else []
+            for line in unit.lines:
+                tokens = estimate_tokens(line)
+                if current and used() + tokens > max_tokens:
+                    yield emit()
+                    # A table split across chunks repeats its heading.
+                    current = list(heading)
+                    section = unit.section
+                current.append(('table', line, tokens, unit.page))
+            continue
+
+        lines = [(unit.lines[0], unit.tokens)]
+        if unit.kind == 'text' and unit.tokens > max_tokens:
+            lines = [(piece, estimate_tokens(piece)) for piece in split_line(unit.lines[0], max_tokens)]
+        for line, tokens in lines:
+            if current and used() + tokens > max_tokens:
+                yield emit()
+                overlap: List[Tuple[str, str, int, int]] = []
+                if unit.kind == 'text':
+                    # Only as much overlap as still leaves room for the line itself.
+                    budget = min(overlap_tokens, max_tokens - tokens)
+                    for item in reversed(current):
+                        if item[0] != 'text' or item[2] > budget:
+                            break
+                        overlap.insert(0, item)
+                        budget -= item[2]
+                current = overlap
+                section = unit.section
+            current.append((unit.kind, line, tokens, unit.page))
+    if current:
+        yield emit()
@@ -0,0 +1,79 @@
+"""Cross-process record of knowledge-base syncs.
+
+`scripts/bedrock_sync.py` bumps a per-KB generation counter after every sync
+that may have changed the index, including one that failed part-way; caches
+in the app compare the generation they were filled under with the current one
+and drop their entries when it has moved on. State lives in
+small JSON files so the sync script and a running Streamlit server can share it.
+
+The sync script also keeps the manifest of the corpus it last synced (path ->
+size, mtime, content hash), so it only starts an ingestion job when documents
+were actually added, changed or deleted.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Tuple
+
+STATE_DIR = os.environ.get('BEDROCK_KB_STATE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.kb_state'))
+
+# kb_id -> (file mtime_ns, generation); avoids re-reading unchanged files on every lookup.
+_seen: Dict[str, Tuple[int, int]] = {}
+
+
+def _state_path(kb_id: str) -> str:
+    return os.path.join(STATE_DIR, f'{kb_id}.json')
+
+
+def sync_generation(kb_id: str) -> int:
+    """Return the number of completed syncs recorded for `kb_id` (0 if none)."""
+    path = _state_path(kb_id)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+    seen = _seen.get(kb_id)
+    if seen and seen[0] == mtime:
+        return seen[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            generation = int(json.load(f).get('generation', 0))
+    except (OSError, ValueError):
+        return seen[1] if seen else 0
+    _seen[kb_id] = (mtime, generation)
+    return generation
+
+
+def mark_synced(kb_id: str) -> int:
+    """Record a completed sync for `kb_id` and return the new generation."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    generation = sync_generation(kb_id) + 1
+    path = _state_path(kb_id)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'synced_at': time.time()}, f)
+    os.replace(tmp_path, path)
+    return generation
+
+
+def _corpus_path(kb_id: str) -> str:
+    return os.path.join(STATE_DIR, f'{kb_id}.corpus.json')
+
+
+def load_corpus_manifest(kb_id: str) -> Dict[str, Dict[str, Any]]:
+    """Return the manifest recorded by the last successful sync of `kb_id` ({} if none)."""
+    try:
+        with open(_corpus_path(kb_id), 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_corpus_manifest(kb_id: str, files: Dict[str, Dict[str, Any]]) -> None:
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _corpus_path(kb_id)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'files': files, 'synced_at': time.time()}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
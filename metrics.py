@@ -0,0 +1,257 @@
+"""Pluggable sinks for per-call Bedrock metrics.
+
+Every model invocation made through `bedrock_utils` produces a
+`GenerationResult` (tokens, stop reason, service latency, client wall time),
+which is handed to the active sink:
+
+- `InMemorySink` keeps recent records and per-model totals (the default);
+- `CsvSink` appends one row per call to a CSV file;
+- `PrometheusSink` keeps counters and renders the Prometheus text format,
+  optionally rewriting a file for node_exporter's textfile collector;
+- `MultiSink` fans out to several sinks, `NullSink` drops everything.
+
+The default sink comes from BEDROCK_METRICS_SINK: `memory` (default), `none`,
+`csv:<path>` or `prometheus:<path>`; `set_sink` replaces it at runtime.
+Sinks only read attributes of the result, so any object with the
+`RECORD_FIELDS` attributes can be recorded.
+"""
+import csv
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+RECORD_FIELDS = ('model_id', 'operation', 'input_tokens', 'output_tokens', 'cache_read_input_tokens',
+                 'cache_creation_input_tokens', 'stop_reason', 'model_latency_ms', 'wall_time_s', 'error')
+_TOKEN_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+# On-demand USD per million tokens (input, output), matched by substring of the
+# model id. Cache reads bill at 10% and cache writes at 125% of the input price.
+MODEL_PRICES_PER_MTOK = {
+    'claude-3-haiku': (0.25, 1.25),
+    'claude-3-5-haiku': (0.80, 4.00),
+    'claude-3-5-sonnet': (3.00, 15.00),
+    'claude-3-7-sonnet': (3.00, 15.00),
+}
+
+
+def as_record(result: Any) -> Dict[str, Any]:
+    """Flatten a result into a plain dict with a timestamp."""
+    record = {'timestamp': time.time()}
+    record.update((field, getattr(result, field, None)) for field in RECORD_FIELDS)
+    return record
+
+
+def estimate_cost(record: Dict[str, Any]) -> Optional[float]:
+    """USD cost of one record from MODEL_PRICES_PER_MTOK, or None for unknown models."""
+    lower_id = (record.get('model_id') or '').lower()
+    # Longest key first so 'claude-3-5-haiku' is not priced as 'claude-3-haiku'.
+    for key in sorted(MODEL_PRICES_PER_MTOK, key=len, reverse=True):
+        if key in lower_id:
+            input_price, output_price = MODEL_PRICES_PER_MTOK[key]
+            break
+    else:
+        return None
+    return ((record.get('input_tokens') or 0) * input_price
+            + (record.get('cache_read_input_tokens') or 0) * input_price * 0.1
+            + (record.get('cache_creation_input_tokens') or 0) * input_price * 1.25
+            + (record.get('output_tokens') or 0) * output_price) / 1e6
+
+
+class MetricsSink:
+    """Base sink; subclasses override `record`."""
+
+    def record(self, result: Any) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+
+class NullSink(MetricsSink):
+    def record(self, result: Any) -> None:
+        pass
+
+
+class InMemorySink(MetricsSink):
+    """Keeps the last `maxlen` records and running per-model totals."""
+
+    def __init__(self, maxlen: int = 10000):
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, result: Any) -> None:
+        record = as_record(result)
+        cost = estimate_cost(record)
+        with self._lock:
+            self.records.append(record)
+            totals = self._totals.setdefault(record['model_id'], dict.fromkeys(
+                ('calls', 'errors', 'wall_time_s', 'cost_usd') + _TOKEN_FIELDS, 0))
+            totals['calls'] += 1
+            totals['errors'] += record['error'] is not None
+            totals['wall_time_s'] += record['wall_time_s'] or 0.0
+            totals['cost_usd'] += cost or 0.0
+            for field in _TOKEN_FIELDS:
+                totals[field] += record[field] or 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-model totals plus output tokens per second of wall time."""
+        with self._lock:
+            summary = {model: dict(totals) for model, totals in self._totals.items()}
+        for totals in summary.values():
+            wall = totals['wall_time_s']
+            totals['output_tokens_per_s'] = totals['output_tokens'] / wall if wall else 0.0
+        return summary
+
+    def last(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.records[-1] if self.records else None
+
+
+class CsvSink(MetricsSink):
+    """Appends one row per call to `path`, writing the header for a new file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=('timestamp',) + RECORD_FIELDS)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def record(self, result: Any) -> None:
+        with self._lock:
+            self._writer.writerow(as_record(result))
+            self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+
+def _escape_label(value: str) -> str:
+    """Escape a label value for the text exposition format (backslash, quote, newline)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusSink(MetricsSink):
+    """Counters per model in the Prometheus text exposition format.
+
+    With `path`, the file is rewritten atomically after every call so a
+    node_exporter textfile collector can scrape it.
+    """
+
+    def __init__(self, path: Optional[str] = None, prefix: str = 'bedrock'):
+        self.path = path
+        self.prefix = prefix
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def record(self, result: Any) -> None:
+        record = as_record(result)
+        model = record['model_id'] or 'unknown'
+        with self._lock:
+            self._inc('requests_total', 1, model=model, operation=record['operation'] or 'invoke',
+                      status='error' if record['error'] is not None else 'ok')
+            for field in _TOKEN_FIELDS:
+                if record[field]:
+                    self._inc(f'{field}_total', record[field], model=model)
+            self._inc('request_seconds_sum', record['wall_time_s'] or 0.0, model=model)
+            self._inc('request_seconds_count', 1, model=model)
+            if record['model_latency_ms'] is not None:
+                self._inc('model_latency_seconds_sum', record['model_latency_ms'] / 1000.0, model=model)
+                self._inc('model_latency_seconds_count', 1, model=model)
+            if record['stop_reason']:
+                self._inc('stop_reason_total', 1, model=model, reason=record['stop_reason'])
+            if self.path:
+                # Under the lock, so a slower writer cannot replace a newer file with older
+                # counts; the temp name is per process and thread, as other writers may share the path.
+                tmp = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(self._render_locked())
+                os.replace(tmp, self.path)
+
+    def _render_locked(self) -> str:
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), value in sorted(self._counters.items()):
+            metric = f'{self.prefix}_{name}'
+            family, kind = metric, 'counter'
+            for suffix in ('_sum', '_count'):
+                if metric.endswith(suffix):
+                    family, kind = metric[:-len(suffix)], 'summary'
+            if family not in typed:
+                typed.add(family)
+                lines.append(f'# TYPE {family} {kind}')
+            label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+            lines.append(f'{metric}{{{label_text}}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def render(self) -> str:
+        with self._lock:
+            return self._render_locked()
+
+
+class MultiSink(MetricsSink):
+    def __init__(self, *sinks: MetricsSink):
+        self.sinks = sinks
+
+    def record(self, result: Any) -> None:
+        for sink in self.sinks:
+            sink.record(result)
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+
+def sink_from_spec(spec: str) -> MetricsSink:
+    """Build a sink from `memory`, `none`, `csv:<path>` or `prometheus[:<path>]`; `+` combines several."""
+    sinks = []
+    for part in spec.split('+'):
+        kind, _, arg = part.strip().partition(':')
+        if kind == 'memory':
+            sinks.append(InMemorySink())
+        elif kind == 'none':
+            sinks.append(NullSink())
+        elif kind == 'csv' and arg:
+            sinks.append(CsvSink(arg))
+        elif kind == 'prometheus':
+            sinks.append(PrometheusSink(arg or None))
+        else:
+            raise ValueError(f'Unknown metrics sink: {part!r}')
+    return sinks[0] if len(sinks) == 1 else MultiSink(*sinks)
+
+
+_sink: Optional[MetricsSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> MetricsSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = sink_from_spec(os.environ.get('BEDROCK_METRICS_SINK', 'memory'))
+    return _sink
+
+
+def set_sink(sink: MetricsSink) -> None:
+    global _sink
+    with _sink_lock:
+        _sink = sink
+
+
+def record(result: Any) -> None:
+    """Send one result to the active sink; sink failures are printed, never raised."""
+    try:
+        get_sink().record(result)
+    except Exception as e:
+        print(f"Error recording metrics: {e}")
@@ -0,0 +1,175 @@
+"""Local first-stage prompt classifier used in front of `valid_prompt`.
+
+Keyword/regex rules decide prompts that are obviously about heavy machinery
+(category E) or obviously out of scope (A, B, D). An optional hashed n-gram
+logistic model, trained offline with `scripts/train_preclassifier.py`, settles
+some of the rest. Anything still ambiguous returns None and is escalated to the
+Bedrock model.
+"""
+import json
+import math
+import os
+import re
+import zlib
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+# Equipment model identifiers from the spec sheets (LE950 is the X950 sheet's own name for
+# it); add new sheets' ids here. There is deliberately no generic "X950" shape: it would take
+# F-150, RTX4090 or A320 questions for machine questions.
+MODEL_ID_RE = re.compile(r'\b(?:x-?950|le-?950|bd-?850|dt-?1000|fl-?250|mc-?750)\b')
+
+EQUIPMENT_RE = re.compile(
+    r'\b(?:excavators?|bulldozers?|dozers?|dump ?trucks?|haul ?trucks?|forklifts?|fork ?lifts?|'
+    r'cranes?|loaders?|backhoes?|graders?|telehandlers?|heavy (?:machinery|equipment))\b'
+)
+
+# Comparison / judgement wording: such questions need reasoning over the specs, not a lookup.
+REASONING_RE = re.compile(
+    r'\b(?:compare|comparison|versus|vs|differences?|better|best|which|why|recommend\w*|should i|'
+    r'trade-?offs?|pros and cons|explain|suitable|instead of)\b'
+)
+
+# "crane" is also a bird: it only counts as equipment next to machine wording.
+_AMBIGUOUS_EQUIPMENT = frozenset({'crane', 'cranes'})
+_CRANE_CONTEXT_RE = re.compile(
+    r'\b(?:mobile|crawler|tower|truck|rough[- ]terrain|all[- ]terrain|gantry|overhead|lattice|boom|jib|'
+    r'outriggers?|counterweights?|load charts?|hook|rigging)\b'
+)
+
+_SPEC_RE = re.compile(
+    r'\b(?:bucket|capacity|horsepower|hp|engine|payload|lift(?:ing)?|boom|tonnage|tons?|weigh(?:s|t)?|'
+    r'dimensions?|hydraulic|torque|fuel|tank|speed|reach|dig(?:ging)? depth|blade|mast|'
+    r'operating|specs?|specifications?)\b'
+)
+
+# Out-of-scope signals, keyed by the category they indicate.
+_OUT_OF_SCOPE_RES: List[Tuple[str, 're.Pattern[str]']] = [
+    ('B', re.compile(r'\b(?:fuck\w*|shit\w*|bitch\w*|bastard\w*|asshole\w*|damn\w*|idiot\w*|stupid)\b')),
+    ('D', re.compile(
+        r'\b(?:ignore (?:all |any |the )?(?:previous|prior|above) instructions?|system prompt|'
+        r'your (?:instructions|rules|prompt)|how do you work|what are you instructed)\b'
+    )),
+    ('A', re.compile(
+        r'\b(?:llm|language model|which model are you|what model are you|your architecture|'
+        r'architecture of (?:the|this) (?:solution|system|app)|transformer|neural network|'
+        r'(?:were|are) you trained)\b'
+    )),
+]
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+class HashedNgramModel:
+    """Tiny logistic-regression scorer over hashed word uni- and bigrams.
+
+    Predicts the probability that a prompt is in scope (category E). Weights
+    are stored sparsely, so a trained model is a small JSON file.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, bias: float = 0.0,
+                 weights: Optional[Dict[int, float]] = None):
+        self.n_features = n_features
+        self.bias = bias
+        self.weights: Dict[int, float] = weights or {}
+
+    def features(self, text: str) -> List[int]:
+        words = _WORD_RE.findall(text.lower())
+        grams = words + [a + ' ' + b for a, b in zip(words, words[1:])]
+        # crc32 is stable across processes, unlike the salted built-in hash().
+        return [zlib.crc32(g.encode('utf-8')) % self.n_features for g in grams]
+
+    def predict_proba(self, text: str) -> float:
+        z = self.bias + sum(self.weights.get(i, 0.0) for i in self.features(text))
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def train(self, examples: Iterable[Tuple[str, bool]], epochs: int = 10, lr: float = 0.5,
+              l2: float = 1e-4) -> None:
+        """Fit with plain SGD on (prompt, in_scope) pairs."""
+        data = [(self.features(text), 1.0 if label else 0.0) for text, label in examples]
+        for _ in range(epochs):
+            for feats, y in data:
+                z = self.bias + sum(self.weights.get(i, 0.0) for i in feats)
+                p = 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+                grad = p - y
+                self.bias -= lr * grad
+                for i in feats:
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - lr * (grad + l2 * w)
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'n_features': self.n_features,
+                'bias': self.bias,
+                'weights': {str(i): round(w, 6) for i, w in self.weights.items() if abs(w) > 1e-6},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'HashedNgramModel':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        weights = {int(i): float(w) for i, w in data.get('weights', {}).items()}
+        return cls(int(data['n_features']), float(data.get('bias', 0.0)), weights)
+
+
+def _load_default_model() -> Optional[HashedNgramModel]:
+    path = os.environ.get('BEDROCK_PRECLASSIFIER_MODEL')
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return HashedNgramModel.load(path)
+    except Exception as e:
+        print(f"Could not load pre-classifier model {path}: {e}")
+        return None
+
+
+# Set BEDROCK_PRECLASSIFIER_MODEL to a file written by scripts/train_preclassifier.py.
+ngram_model = _load_default_model()
+
+# The n-gram model only decides when it is this sure either way.
+CONFIDENCE = 0.95
+
+
+def extract_model_ids(text: str) -> FrozenSet[str]:
+    """Return the equipment model ids mentioned in `text`, normalized ("BD-850" -> "bd850")."""
+    return frozenset(m.replace('-', '') for m in MODEL_ID_RE.findall((text or '').lower()))
+
+
+def extract_equipment_types(text: str) -> FrozenSet[str]:
+    """Return the equipment type words mentioned in `text` ("excavator", "dump truck", ...)."""
+    return frozenset(EQUIPMENT_RE.findall((text or '').lower()))
+
+
+def preclassify(prompt: str, model: Optional[HashedNgramModel] = None) -> Optional[Dict[str, Any]]:
+    """Classify `prompt` locally when the answer is obvious.
+
+    Returns {'category': 'A'..'E', 'raw': '<reason>', 'source': 'local'} in the
+    same shape as `valid_prompt`, or None when the prompt should be escalated to
+    the LLM.
+    """
+    text = (prompt or '').lower()
+    if not text.strip():
+        return None
+
+    out_of_scope = [cat for cat, pattern in _OUT_OF_SCOPE_RES if pattern.search(text)]
+    equipment = extract_equipment_types(text)
+    has_equipment = bool(MODEL_ID_RE.search(text) or equipment - _AMBIGUOUS_EQUIPMENT
+                         or (equipment and _CRANE_CONTEXT_RE.search(text)))
+
+    if out_of_scope and not has_equipment:
+        return {'category': out_of_scope[0], 'raw': f'Category {out_of_scope[0]} (local rule)', 'source': 'local'}
+    if has_equipment and not out_of_scope and _SPEC_RE.search(text):
+        return {'category': 'E', 'raw': 'Category E (local rule)', 'source': 'local'}
+    if out_of_scope:
+        # Mixed signals (e.g. profanity about an excavator): let the LLM decide.
+        return None
+
+    model = model if model is not None else ngram_model
+    if model is not None:
+        p = model.predict_proba(text)
+        if p >= CONFIDENCE:
+            return {'category': 'E', 'raw': f'Category E (local model p={p:.2f})', 'source': 'local'}
+        if p <= 1.0 - CONFIDENCE:
+            return {'category': 'C', 'raw': f'Category C (local model p={p:.2f})', 'source': 'local'}
+    return None
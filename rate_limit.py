@@ -0,0 +1,366 @@
+"""Client-side rate limiting shared by every Bedrock call path.
+
+Each key (a model id, or `retrieve` for knowledge-base queries) gets a
+`ModelLimiter` combining:
+
+- token buckets for requests per minute and (estimated) tokens per minute,
+  refilled continuously; a call's token estimate is reserved up front, as
+  Bedrock does with `max_tokens`, and corrected once actual usage is known;
+- an AIMD concurrency limit: a throttled call halves it, each success grows
+  it by 1/limit, up to `max_concurrency`;
+- a bounded wait queue: callers block until the buckets and the concurrency
+  limit admit them. Only a full queue or a wait longer than `queue_timeout`
+  raises `RateLimitExceeded`, so overload turns into backpressure rather than
+  a burst of failed calls.
+
+`ModelLimiter.call` / `acall` wrap a call with acquire/release and retry
+throttled and transient (5xx, timeout, connection) failures with jittered
+exponential backoff; only throttles shrink the concurrency limit. They are the
+only retry layer: the clients they wrap are built with botocore retries off
+(`bedrock_clients.LIMITER_RETRIES`), so every throttle reaches AIMD. Queue depth, wait times
+and throttles are reported by `stats()`.
+
+Configured from the environment (account quotas differ, so buckets are off
+unless set; keys match by substring of the model id):
+
+  BEDROCK_RPM              e.g. "claude-3-haiku=1000,claude-3-5-sonnet=250,retrieve=600"
+  BEDROCK_TPM              e.g. "claude-3-haiku=400000,claude-3-5-sonnet=200000"
+  BEDROCK_MAX_CONCURRENCY  concurrent calls per key                  (16)
+  BEDROCK_MAX_QUEUE        waiting callers per key before rejecting  (256)
+  BEDROCK_QUEUE_TIMEOUT    seconds a caller may wait                 (60)
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Error codes that mean "slow down" rather than "this request is bad".
+THROTTLING_CODES = ('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException')
+
+
+# Server-side failures worth another attempt, as botocore's own retry handler would give them.
+TRANSIENT_CODES = ('InternalServerException', 'InternalFailure', 'ServiceFailure', 'ModelTimeoutException',
+                   'ModelNotReadyException', 'RequestTimeout', 'RequestTimeoutException')
+
+
+def _error_code(error: BaseException) -> Optional[str]:
+    response = getattr(error, 'response', None)
+    return (response.get('Error') or {}).get('Code') if isinstance(response, dict) else None
+
+
+def is_throttle(error: BaseException) -> bool:
+    """True for botocore ClientErrors carrying a throttling error code."""
+    return _error_code(error) in THROTTLING_CODES
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for 5xx-style service errors and connection / read timeouts, which may succeed on retry."""
+    if _error_code(error) in TRANSIENT_CODES:
+        return True
+    response = getattr(error, 'response', None)
+    metadata = (response.get('ResponseMetadata') or {}) if isinstance(response, dict) else {}
+    if isinstance(metadata.get('HTTPStatusCode'), int) and metadata['HTTPStatusCode'] >= 500:
+        return True
+    # Imported here: botocore is only needed once a call has actually failed.
+    from botocore.exceptions import ConnectionError as BotocoreConnectionError, HTTPClientError
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+
+def _parse_limits(spec: str) -> Dict[str, float]:
+    limits = {}
+    for part in spec.split(','):
+        key, _, value = part.partition('=')
+        if key.strip() and value.strip():
+            limits[key.strip()] = float(value)
+    return limits
+
+
+RPM_LIMITS = _parse_limits(os.environ.get('BEDROCK_RPM', ''))
+TPM_LIMITS = _parse_limits(os.environ.get('BEDROCK_TPM', ''))
+MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', '16'))
+MAX_QUEUE = int(os.environ.get('BEDROCK_MAX_QUEUE', '256'))
+QUEUE_TIMEOUT = float(os.environ.get('BEDROCK_QUEUE_TIMEOUT', '60'))
+
+
+class RateLimitExceeded(Exception):
+    """The wait queue is full or a caller waited longer than the queue timeout."""
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to `capacity` (one minute's worth by default)."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken; 0 if it can be taken now.
+
+        Requests larger than the capacity are admitted once the bucket is full
+        and leave it in debt, rather than waiting forever.
+        """
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) `delta` after the fact."""
+        self.level = min(self.capacity, self.level - delta)
+
+
+class ModelLimiter:
+    """RPM/TPM buckets, AIMD concurrency and a bounded queue for one key."""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._cond = threading.Condition()
+        self._stats = dict.fromkeys(('acquired', 'waited', 'throttles', 'retries', 'rejected', 'max_queued'), 0)
+        self._wait_s_total = 0.0
+        self._wait_s_max = 0.0
+
+    def _try_acquire_locked(self, tokens: float) -> Optional[float]:
+        """Take a slot and bucket capacity and return None, or return seconds to wait."""
+        if self.in_flight >= int(self.limit):
+            return float('inf')  # woken by release()
+        now = time.monotonic()
+        wait = max(self.requests.wait_time(1, now) if self.requests else 0.0,
+                   self.tokens.wait_time(tokens, now) if self.tokens and tokens else 0.0)
+        if wait > 0:
+            return wait
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens and tokens:
+            self.tokens.take(tokens)
+        self.in_flight += 1
+        return None
+
+    def _enqueue_locked(self) -> None:
+        if self.queued >= self.max_queue:
+            self._stats['rejected'] += 1
+            raise RateLimitExceeded(f'{self.name}: {self.queued} callers already waiting')
+        self.queued += 1
+        self._stats['max_queued'] = max(self._stats['max_queued'], self.queued)
+
+    def _admitted_locked(self, waited: float) -> None:
+        self.queued -= 1
+        self._stats['acquired'] += 1
+        if waited > 0.001:
+            self._stats['waited'] += 1
+            self._wait_s_total += waited
+            self._wait_s_max = max(self._wait_s_max, waited)
+
+    def _abandoned(self) -> None:
+        """Give back the queue slot of a waiter that was cancelled or interrupted."""
+        with self._cond:
+            self.queued -= 1
+            self._cond.notify_all()
+
+    def _timed_out_locked(self, waited: float) -> RateLimitExceeded:
+        self.queued -= 1
+        self._stats['rejected'] += 1
+        return RateLimitExceeded(f'{self.name}: no capacity after waiting {waited:.1f}s')
+
+    def acquire(self, tokens: float = 0, timeout: Optional[float] = None) -> float:
+        """Block until admitted; returns the seconds waited."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self._cond:
+            self._enqueue_locked()
+            while True:
+                hint = self._try_acquire_locked(tokens)
+                waited = time.monotonic() - start
+                if hint is None:
+                    self._admitted_locked(waited)
+                    return waited
+                if waited >= timeout:
+                    raise self._timed_out_locked(waited)
+                try:
+                    self._cond.wait(min(hint, timeout - waited))
+                except BaseException:
+                    # Interrupted while queued (KeyboardInterrupt); the lock is held again here.
+                    self.queued -= 1
+                    raise
+
+    async def aacquire(self, tokens: float = 0, timeout: Optional[float] = None) -> float:
+        """`acquire` for coroutines: polls with asyncio.sleep instead of blocking the loop."""
+        import asyncio
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self._cond:
+            self._enqueue_locked()
+        while True:
+            with self._cond:
+                hint = self._try_acquire_locked(tokens)
+                waited = time.monotonic() - start
+                if hint is None:
+                    self._admitted_locked(waited)
+                    return waited
+                if waited >= timeout:
+                    raise self._timed_out_locked(waited)
+            try:
+                await asyncio.sleep(min(hint, 0.05, timeout - waited))
+            except BaseException:
+                # Cancelled while queued (e.g. the caller's task was cancelled).
+                self._abandoned()
+                raise
+
+    def release(self, throttled: bool = False, token_delta: float = 0) -> None:
+        """Free the slot, adapt the concurrency limit and correct the token reservation."""
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._stats['throttles'] += 1
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            if token_delta and self.tokens:
+                self.tokens.adjust(token_delta)
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered exponential delay before retry `attempt` of a throttled or transient failure."""
+        with self._cond:
+            self._stats['retries'] += 1
+        return min(0.25 * 2 ** attempt, 10.0) * random.uniform(0.5, 1.0)
+
+    def call(self, fn: Callable[..., Any], *args: Any, tokens: float = 0, max_retries: int = 5,
+             actual_tokens: Optional[Callable[[Any], Optional[float]]] = None, **kwargs: Any) -> Any:
+        """Run `fn(*args, **kwargs)` under the limiter, retrying throttled and transient failures.
+
+        `tokens` is the estimate reserved against TPM; `actual_tokens(result)`,
+        if given, returns the real usage so the reservation can be corrected.
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens)
+            throttled = False
+            delta = 0.0
+            try:
+                result = fn(*args, **kwargs)
+                used = actual_tokens(result) if actual_tokens is not None else None
+                if used is not None:
+                    delta = used - tokens
+                return result
+            except Exception as e:
+                throttled = is_throttle(e)
+                if not (throttled or is_transient(e)) or attempt == max_retries:
+                    raise
+            finally:
+                self.release(throttled, delta)
+            time.sleep(self.backoff(attempt))
+
+    def call_and_hold(self, fn: Callable[..., Any], *args: Any, tokens: float = 0, max_retries: int = 5,
+                      **kwargs: Any) -> Any:
+        """Like `call`, but a successful call keeps its slot until the caller calls `release`.
+
+        For response streams, which occupy capacity until they are consumed.
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire(tokens)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle(e)
+                self.release(throttled)
+                if not (throttled or is_transient(e)) or attempt == max_retries:
+                    raise
+            time.sleep(self.backoff(attempt))
+
+    async def acall(self, fn: Callable[..., Any], *args: Any, tokens: float = 0, max_retries: int = 5,
+                    actual_tokens: Optional[Callable[[Any], Optional[float]]] = None, **kwargs: Any) -> Any:
+        """`call` for coroutine functions."""
+        import asyncio
+
+        for attempt in range(max_retries + 1):
+            await self.aacquire(tokens)
+            throttled = False
+            delta = 0.0
+            try:
+                result = await fn(*args, **kwargs)
+                used = actual_tokens(result) if actual_tokens is not None else None
+                if used is not None:
+                    delta = used - tokens
+                return result
+            except Exception as e:
+                throttled = is_throttle(e)
+                if not (throttled or is_transient(e)) or attempt == max_retries:
+                    raise
+            finally:
+                self.release(throttled, delta)
+            await asyncio.sleep(self.backoff(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats.update({
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'wait_s_mean': self._wait_s_total / stats['waited'] if stats['waited'] else 0.0,
+                'wait_s_max': self._wait_s_max,
+            })
+        return stats
+
+
+def _limit_for(key: str, limits: Dict[str, float]) -> Optional[float]:
+    lower_key = key.lower()
+    # Longest pattern first so more specific entries win.
+    for pattern in sorted(limits, key=len, reverse=True):
+        if pattern.lower() in lower_key:
+            return limits[pattern]
+    return None
+
+
+class RateLimits:
+    """Registry of per-key limiters built from the environment on first use."""
+
+    def __init__(self):
+        self._limiters: Dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> ModelLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = self._limiters[key] = ModelLimiter(
+                        key, rpm=_limit_for(key, RPM_LIMITS), tpm=_limit_for(key, TPM_LIMITS))
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {key: limiter.stats() for key, limiter in limiters.items()}
+
+    def clear(self) -> None:
+        """Forget all limiters (and their adapted limits)."""
+        with self._lock:
+            self._limiters.clear()
+
+
+rate_limits = RateLimits()
+
+
+def limiter_for(key: str) -> ModelLimiter:
+    return rate_limits.get(key)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Regenerate answers for a file of stored questions.
+
+Input is JSONL with one question per line. By default rows are read in the
+same shape as the backlog files this repo uses (`request_id` + `body`); use
+`--id-field`/`--text-field` for other layouts.
+
+Modes:
+  ondemand  concurrent invoke_model calls with a worker pool and RPM limit
+  job       write batch-inference JSONL, upload it, submit a Bedrock batch
+            inference job, wait for it and stream the results back
+
+Usage:
+  python scripts/batch_generate.py questions.jsonl --out answers.jsonl --workers 8 --rpm 300
+  python scripts/batch_generate.py questions.jsonl --out answers.jsonl --mode job \
+      --bucket my-bucket --role-arn arn:aws:iam::123456789012:role/bedrock-batch
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import batch_generation
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_MODEL = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+
+def load_questions(path, id_field, text_field):
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for n, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            rows.append((str(row.get(id_field) or n), row[text_field]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', help='JSONL file of questions')
+    parser.add_argument('--out', required=True, help='Where to write {"id", "answer"} JSONL')
+    parser.add_argument('--mode', choices=('ondemand', 'job'), default='ondemand')
+    parser.add_argument('--model-id', default=DEFAULT_MODEL)
+    parser.add_argument('--id-field', default='request_id')
+    parser.add_argument('--text-field', default='body')
+    parser.add_argument('--max-tokens', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=8, help='ondemand: concurrent requests')
+    parser.add_argument('--rpm', type=float, help='ondemand: requests-per-minute ceiling')
+    parser.add_argument('--bucket', help='job: S3 bucket for batch input/output')
+    parser.add_argument('--prefix', default='batch-inference', help='job: S3 key prefix')
+    parser.add_argument('--role-arn', help='job: IAM role Bedrock assumes to read/write S3')
+    parser.add_argument('--poll-interval', type=float, default=60.0, help='job: seconds between status checks')
+    args = parser.parse_args()
+
+    from batch_generation import (generate_batch, stream_batch_results, submit_batch_job,
+                                  wait_for_batch_job, write_batch_input)
+
+    questions = load_questions(args.input, args.id_field, args.text_field)
+    print(f'Loaded {len(questions)} questions from {args.input}')
+    start = time.perf_counter()
+
+    if args.mode == 'ondemand':
+        answers = generate_batch([q for _, q in questions], args.model_id, max_tokens=args.max_tokens,
+                                 max_workers=args.workers, requests_per_minute=args.rpm)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for (record_id, _), answer in zip(questions, answers):
+                f.write(json.dumps({'id': record_id, 'answer': answer}) + '\n')
+        failed = sum(a is None for a in answers)
+    else:
+        if not args.bucket or not args.role_arn:
+            print('--mode job requires --bucket and --role-arn')
+            sys.exit(2)
+        from bedrock_clients import get_client
+        s3 = get_client('s3')
+        run_prefix = f"{args.prefix.rstrip('/')}/{int(time.time())}"
+        with tempfile.TemporaryDirectory() as tmp:
+            local_input = os.path.join(tmp, 'input.jsonl')
+            count = write_batch_input(questions, local_input, args.model_id, max_tokens=args.max_tokens)
+            s3.upload_file(local_input, args.bucket, f'{run_prefix}/input.jsonl')
+        print(f'Uploaded {count} records to s3://{args.bucket}/{run_prefix}/input.jsonl')
+
+        output_uri = f's3://{args.bucket}/{run_prefix}/output/'
+        job_arn = submit_batch_job(f's3://{args.bucket}/{run_prefix}/input.jsonl', output_uri,
+                                   args.model_id, args.role_arn)
+        print(f'Submitted batch job {job_arn}; waiting...')
+        job = wait_for_batch_job(job_arn, poll_interval=args.poll_interval)
+        print('Job finished with status:', job.get('status'), job.get('message') or '')
+
+        failed = 0
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for row in stream_batch_results(output_uri, job_arn, s3_client=s3):
+                failed += row['text'] is None
+                f.write(json.dumps({'id': row['recordId'], 'answer': row['text'], 'error': row['error']}) + '\n')
+
+    elapsed = time.perf_counter() - start
+    print(f'Wrote {args.out}: {len(questions)} questions, {failed} failed, {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,144 @@
 #!/usr/bin/env python3
-"""Trigger and poll a Bedrock Agent knowledge-base sync using the AWS CLI.
+"""Start and wait for Bedrock knowledge-base ingestion jobs.
 
-This script uses the AWS CLI to start a knowledge-base sync (if supported by your
-installed AWS CLI) and polls the knowledge-base status until it reaches a terminal
-state (ACTIVE or FAILED). It accepts a knowledge-base ID via `--kb-id` or will
+Before starting a sync the script compares the local spec-sheet corpus
+(`--folder`) with the manifest recorded by the last successful sync (content
+hashes, under `.kb_state/`) and reports which documents were added, changed or
+deleted. When nothing changed it exits without starting an ingestion job, so
+no-op re-embeddings are neither paid for nor waited on. Any number of uploads
+made since the last sync are picked up by a single job; with `--upload` the
+script uploads the delta itself (and deletes removed documents from S3) first.
+
+The sync starts one ingestion job per data source of the KB (or those given
+with `--data-source-id`) on a shared boto3 `bedrock-agent` client, then waits
+for all of them concurrently, polling `get_ingestion_job` with jittered
+exponential backoff (`--poll-initial` doubling up to `--poll-interval`). A data
+source that already has a job running is waited on instead of failing. Each
+job's statistics (documents scanned, indexed, deleted, failed) and the elapsed
+time are printed at the end. It accepts a knowledge-base ID via `--kb-id` or will
 attempt to read it from Terraform state in `stack2`.
 
 Usage:
   python scripts/bedrock_sync.py --kb-id DOQID9QB63
   # or let the script read the KB id from stack2 terraform output
   python scripts/bedrock_sync.py --auto
+  # upload changed spec sheets, then sync once
+  python scripts/bedrock_sync.py --kb-id DOQID9QB63 --upload
+  # report the delta only / sync even if nothing changed
+  python scripts/bedrock_sync.py --kb-id DOQID9QB63 --dry-run
+  python scripts/bedrock_sync.py --kb-id DOQID9QB63 --force
+
+  # one data source, give up after 20 minutes
+  python scripts/bedrock_sync.py --kb-id DOQID9QB63 --data-source-id ABCDEF1234 --timeout 1200
 
 Notes:
-  - This script calls the AWS CLI (subprocess). Ensure the `aws` CLI is installed
-    and configured in your environment and has permissions to manage Bedrock Agent resources.
-  - If your CLI does not expose Bedrock Agent commands, use the AWS Console to start a sync.
+  - Credentials need bedrock:ListDataSources, StartIngestionJob, GetIngestionJob
+    and ListIngestionJobs on the knowledge base.
+  - The first run for a KB has no manifest, so every document counts as added.
+  - A successful sync records the folder as the new baseline, so without
+    `--upload` the bucket is assumed to hold the local files (upload them with
+    upload_s3.py first).
 """
 import argparse
+import functools
+import hashlib
 import json
-import shutil
+import os
+import random
 import subprocess
 import sys
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure project root is on sys.path so we can import kb_sync_state
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from kb_sync_state import load_corpus_manifest, mark_synced, save_corpus_manifest
+
+DEFAULT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spec-sheets')
+
+
+@dataclass
+class CorpusDelta:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.deleted)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_corpus(folder, previous=None) -> Dict[str, Dict[str, Any]]:
+    """Return {relative path: {'size', 'mtime_ns', 'sha256'}} for the files under `folder`.
+
+    Files whose size and mtime match `previous` keep their recorded hash
+    instead of being re-read.
+    """
+    previous = previous or {}
+    files = {}
+    for root, _dirs, names in os.walk(folder):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, folder).replace('\\', '/')
+            stat = os.stat(path)
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            old = previous.get(rel)
+            if old and old.get('size') == stat.st_size and old.get('mtime_ns') == stat.st_mtime_ns:
+                entry['sha256'] = old['sha256']
+            else:
+                entry['sha256'] = _sha256(path)
+            files[rel] = entry
+    return files
+
+
+def diff_corpus(previous, current) -> CorpusDelta:
+    delta = CorpusDelta()
+    for rel, entry in sorted(current.items()):
+        if rel not in previous:
+            delta.added.append(rel)
+        elif previous[rel].get('sha256') != entry['sha256']:
+            delta.changed.append(rel)
+    delta.deleted = sorted(set(previous) - set(current))
+    return delta
+
+
+def print_delta(delta):
+    print(f'Corpus changes since last sync: {len(delta.added)} added, {len(delta.changed)} changed, '
+          f'{len(delta.deleted)} deleted')
+    for label, paths in (('+', delta.added), ('~', delta.changed), ('-', delta.deleted)):
+        for rel in paths:
+            print(f'  {label} {rel}')
+
+
+def upload_delta(folder, bucket, prefix, delta):
+    """Upload new/changed documents and delete removed ones from S3; returns False on any failure."""
+    from bedrock_clients import get_client
+    from upload_s3 import upload_files_to_s3
+
+    report = upload_files_to_s3(folder, bucket, prefix)
+    if report is None or report.failed:
+        return False
+    if delta.deleted:
+        keys = [{'Key': f"{prefix.rstrip('/')}/{rel}" if prefix else rel} for rel in delta.deleted]
+        s3 = get_client('s3')
+        for i in range(0, len(keys), 1000):
+            response = s3.delete_objects(Bucket=bucket, Delete={'Objects': keys[i:i + 1000], 'Quiet': True})
+            for error in response.get('Errors', []):
+                print(f"Error deleting {error.get('Key')}: {error.get('Message')}")
+                return False
+        print(f'Deleted {len(keys)} removed documents from {bucket}/{prefix}')
+    return True
 
 
 def run_cmd(cmd):
@@ -33,44 +149,104 @@ def run_cmd(cmd):
         return 127, '', f"command not found: {cmd[0]}"
 
 
-def aws_cli_available():
-    return shutil.which('aws') is not None
-
-
-def start_sync_cli(kb_id):
-    # Try multiple plausible Bedrock Agent CLI command names until one works.
-    candidates = [
-        'bedrock-agent',
-        'bedrock-agentcore',
-        'bedrockagent',
-    ]
-    last_err = None
-    for cmd_name in candidates:
-        start_cmd = ['aws', cmd_name, 'start-knowledge-base-sync', '--knowledge-base-id', kb_id]
-        code, out, err = run_cmd(start_cmd)
-        if code == 0:
-            try:
-                return True, json.loads(out)
-            except Exception:
-                return True, out
-        last_err = (cmd_name, code, out, err)
-
-    # Nothing worked — return last error for diagnostics.
-    return False, last_err
-
-
-def get_kb_status_cli(kb_id):
-    get_cmd = ['aws', 'bedrockagent', 'get-knowledge-base', '--knowledge-base-id', kb_id, '--output', 'json']
-    code, out, err = run_cmd(get_cmd)
-    if code != 0:
-        return None, (code, out, err)
+POLL_INITIAL = 2.0
+POLL_MAX = 30.0
+TERMINAL_STATUSES = ('COMPLETE', 'FAILED', 'STOPPED')
+# ingestionJob['statistics'] fields -> labels in the summary.
+JOB_STATISTICS = (
+    ('numberOfDocumentsScanned', 'scanned'),
+    ('numberOfNewDocumentsIndexed', 'new'),
+    ('numberOfModifiedDocumentsIndexed', 'modified'),
+    ('numberOfDocumentsDeleted', 'deleted'),
+    ('numberOfDocumentsFailed', 'failed'),
+)
+INDEX_CHANGE_STATISTICS = ('numberOfNewDocumentsIndexed', 'numberOfModifiedDocumentsIndexed',
+                           'numberOfDocumentsDeleted')
+
+
+def poll_delay(attempt, initial=POLL_INITIAL, maximum=POLL_MAX):
+    """Exponential backoff with jitter, so several waiters do not poll in lockstep."""
+    return min(initial * 2 ** attempt, maximum) * random.uniform(0.5, 1.0)
+
+
+def list_data_source_ids(client, kb_id) -> List[str]:
+    ids, token = [], None
+    while True:
+        kwargs = {'knowledgeBaseId': kb_id, 'maxResults': 100}
+        if token:
+            kwargs['nextToken'] = token
+        response = client.list_data_sources(**kwargs)
+        ids += [ds['dataSourceId'] for ds in response.get('dataSourceSummaries', [])]
+        token = response.get('nextToken')
+        if not token:
+            return ids
+
+
+def start_ingestion(client, kb_id, data_source_id) -> Dict[str, Any]:
+    """Start an ingestion job, or adopt the one already running for the data source."""
+    from botocore.exceptions import ClientError
+
     try:
-        data = json.loads(out)
-        # status might be in data['status'] or data['knowledgeBase']['status'] depending on API
-        status = data.get('status') or data.get('knowledgeBase', {}).get('status')
-        return status, data
-    except Exception:
-        return None, out
+        return client.start_ingestion_job(knowledgeBaseId=kb_id, dataSourceId=data_source_id,
+                                          description='bedrock_sync.py')['ingestionJob']
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConflictException':
+            raise
+    running = client.list_ingestion_jobs(
+        knowledgeBaseId=kb_id, dataSourceId=data_source_id, maxResults=1,
+        filters=[{'attribute': 'STATUS', 'operator': 'EQ', 'values': ['STARTING', 'IN_PROGRESS']}],
+        sortBy={'attribute': 'STARTED_AT', 'order': 'DESCENDING'},
+    ).get('ingestionJobSummaries', [])
+    if not running:
+        raise RuntimeError(f'Data source {data_source_id} is busy but has no running ingestion job')
+    print(f'[{data_source_id}] ingestion job {running[0]["ingestionJobId"]} already running; waiting for it')
+    return running[0]
+
+
+async def wait_for_job(client, kb_id, job, timeout, initial=POLL_INITIAL, maximum=POLL_MAX):
+    """Poll `get_ingestion_job` until the job is terminal; returns (job, seconds waited)."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    data_source_id, job_id = job['dataSourceId'], job['ingestionJobId']
+    start = time.monotonic()
+    status, attempt = job.get('status'), 0
+    while status not in TERMINAL_STATUSES:
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f'ingestion job {job_id} still {status} after {timeout:.0f}s')
+        await asyncio.sleep(poll_delay(attempt, initial, maximum))
+        attempt += 1
+        response = await loop.run_in_executor(None, functools.partial(
+            client.get_ingestion_job, knowledgeBaseId=kb_id, dataSourceId=data_source_id, ingestionJobId=job_id))
+        job = response['ingestionJob']
+        if job['status'] != status:
+            status = job['status']
+            print(f'[{data_source_id}] {status} after {time.monotonic() - start:.0f}s')
+    return job, time.monotonic() - start
+
+
+async def wait_for_jobs(client, kb_id, jobs, timeout, initial=POLL_INITIAL, maximum=POLL_MAX):
+    import asyncio
+
+    return await asyncio.gather(*(wait_for_job(client, kb_id, job, timeout, initial, maximum) for job in jobs),
+                                return_exceptions=True)
+
+
+def may_have_changed_index(job):
+    """False only for a job that stopped or failed before indexing or deleting any document."""
+    if job['status'] == 'COMPLETE':
+        return True
+    stats = job.get('statistics') or {}
+    return any(stats.get(key) for key in INDEX_CHANGE_STATISTICS)
+
+
+def format_job(job, seconds):
+    stats = job.get('statistics') or {}
+    counts = ', '.join(f'{stats.get(key, 0)} {label}' for key, label in JOB_STATISTICS)
+    line = f"[{job['dataSourceId']}] {job['status']} in {seconds:.1f}s: {counts}"
+    for reason in job.get('failureReasons') or ():
+        line += f'\n    {reason}'
+    return line
 
 
 def read_kb_from_terraform():
@@ -112,7 +288,17 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--kb-id', help='Knowledge Base ID to sync')
     parser.add_argument('--auto', action='store_true', help='Auto-detect KB ID from stack2 terraform output')
-    parser.add_argument('--poll-interval', type=int, default=10, help='Polling interval seconds')
+    parser.add_argument('--data-source-id', action='append',
+                        help='Data source to ingest (repeatable; default: every data source of the KB)')
+    parser.add_argument('--poll-initial', type=float, default=POLL_INITIAL, help='First poll delay in seconds')
+    parser.add_argument('--poll-interval', type=float, default=POLL_MAX, help='Maximum poll delay in seconds')
+    parser.add_argument('--timeout', type=float, default=3600, help='Give up waiting after this many seconds')
+    parser.add_argument('--folder', default=DEFAULT_FOLDER, help='Local corpus the KB data source mirrors')
+    parser.add_argument('--upload', action='store_true', help='Upload the delta to S3 before syncing')
+    parser.add_argument('--bucket', default=os.environ.get('UPLOAD_BUCKET_NAME', 'bedrock-kb-975050171524'))
+    parser.add_argument('--prefix', default='spec-sheets')
+    parser.add_argument('--dry-run', action='store_true', help='Report the delta without uploading or syncing')
+    parser.add_argument('--force', action='store_true', help='Sync even when the corpus is unchanged')
     args = parser.parse_args()
 
     kb_id = args.kb_id
@@ -126,43 +312,67 @@ def main():
         print('Please provide a knowledge-base id with --kb-id or use --auto to read from terraform.')
         sys.exit(2)
 
-    if not aws_cli_available():
-        print('The AWS CLI is not available in PATH. Install and configure it, then re-run this script.')
+    if not os.path.isdir(args.folder):
+        print(f"Corpus folder '{args.folder}' does not exist.")
         sys.exit(2)
+    previous = load_corpus_manifest(kb_id)
+    corpus = scan_corpus(args.folder, previous)
+    delta = diff_corpus(previous, corpus)
+    print_delta(delta)
+    if args.dry_run:
+        return
+    if not delta and not args.force:
+        print('Nothing to ingest; not starting a sync (use --force to sync anyway).')
+        return
 
-    print(f'Starting sync for knowledge base: {kb_id}')
-    ok, result = start_sync_cli(kb_id)
-    if not ok:
-        # start_sync_cli returns a diagnostics tuple (cmd_name, code, out, err)
-        # or similar; guard against different shapes and print helpful info.
-        print('Failed to start sync via AWS CLI. Diagnostics:')
-        if isinstance(result, tuple) and len(result) == 4:
-            cmd_name, code, out, err = result
-            print('Tried CLI command:', cmd_name)
-            print('Exit code:', code)
-            print('Stdout:', out)
-            print('Stderr:', err)
-        else:
-            print(result)
-        print('\nYour installed AWS CLI may not include Bedrock Agent operations.\n')
-        print('To trigger a sync manually, open the Bedrock Console:')
-        print(f'https://console.aws.amazon.com/bedrock/home?region=us-west-2#/knowledge-bases/{kb_id}')
+    if args.upload and not upload_delta(args.folder, args.bucket, args.prefix, delta):
+        print('Upload failed; not starting a sync.')
         sys.exit(1)
 
-    print('Sync started. Polling status...')
-    while True:
-        status, info = get_kb_status_cli(kb_id)
-        if status is None:
-            print('Could not read KB status. Response:', info)
-            sys.exit(1)
-        print('Status:', status)
-        if str(status).upper() in ('ACTIVE', 'COMPLETED', 'FAILED'):
-            print('Terminal status reached:', status)
-            break
-        time.sleep(args.poll_interval)
-
-    print('Final KB info:')
-    print(json.dumps(info, indent=2))
+    import asyncio
+
+    from bedrock_clients import get_client
+
+    client = get_client('bedrock-agent')
+    data_source_ids = args.data_source_id or list_data_source_ids(client, kb_id)
+    if not data_source_ids:
+        print(f'Knowledge base {kb_id} has no data sources.')
+        sys.exit(1)
+
+    print(f'Starting ingestion for knowledge base {kb_id}: {", ".join(data_source_ids)}')
+    start = time.monotonic()
+    jobs = []
+    ok = True
+    for ds in data_source_ids:
+        # One data source failing to start must not strand the jobs already started.
+        try:
+            jobs.append(start_ingestion(client, kb_id, ds))
+        except Exception as e:
+            print(f'[{ds}] could not start ingestion: {e}')
+            ok = False
+    results = asyncio.run(wait_for_jobs(client, kb_id, jobs, args.timeout, args.poll_initial, args.poll_interval))
+
+    changed = False
+    for job, result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            # Timed out or lost track of it: the job may still be changing the index.
+            print(f"[{job['dataSourceId']}] error: {result}")
+            ok, changed = False, True
+            continue
+        print(format_job(*result))
+        ok = ok and result[0]['status'] == 'COMPLETE'
+        changed = changed or may_have_changed_index(result[0])
+    print(f'Elapsed: {time.monotonic() - start:.1f}s')
+
+    # Tell running apps that cached retrievals and answers are now stale, even when
+    # the run failed part-way: a partial sync has still changed what the KB returns.
+    if changed:
+        generation = mark_synced(kb_id)
+        print(f'Recorded sync generation {generation} for cache invalidation')
+    if not ok:
+        sys.exit(1)
+    # The folder just synced is the baseline for the next change check.
+    save_corpus_manifest(kb_id, corpus)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Simulate request hedging against a latency-injecting local stub.
+
+The stub `retrieve` sleeps for a log-normal latency and, with probability
+`--slow-prob`, for `--slow-factor` times that (a straggler). Each
+configuration installs a `Hedger` as `bedrock_utils.retrieve_hedger` and sends
+the same number of distinct queries through `query_knowledge_base` (so through
+the shared `retrieve` rate limiter, as in the app), then reports latency
+percentiles and the extra load hedging caused; no AWS calls are made.
+
+Usage:
+  python scripts/bench_hedging.py
+  python scripts/bench_hedging.py --requests 2000 --slow-prob 0.05 --percentiles 90,95,99 --budget 0.2
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import bedrock_utils
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import bedrock_utils
+from bedrock_utils import invalidate_retrieval_cache, query_knowledge_base
+from hedging import Hedger
+
+
+class SlowTailRetrieveClient:
+    def __init__(self, median_s, sigma, slow_prob, slow_factor, seed=0):
+        self.median_s = median_s
+        self.sigma = sigma
+        self.slow_prob = slow_prob
+        self.slow_factor = slow_factor
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        with self._lock:
+            self.calls += 1
+            latency = self.median_s * math.exp(self._rng.gauss(0.0, self.sigma))
+            if self._rng.random() < self.slow_prob:
+                latency *= self.slow_factor
+        time.sleep(latency)
+        return {'retrievalResults': [{'content': {'text': retrievalQuery['text']}, 'score': 1.0}]}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+def run(hedger, client, requests, concurrency):
+    bedrock_utils.retrieve_hedger = hedger
+    invalidate_retrieval_cache()
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        query_knowledge_base(f'query {i}', 'STUBKB', client=client)
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--median-ms', type=float, default=40.0)
+    parser.add_argument('--sigma', type=float, default=0.3, help='Log-normal spread of normal responses')
+    parser.add_argument('--slow-prob', type=float, default=0.03, help='Probability of a straggler')
+    parser.add_argument('--slow-factor', type=float, default=15.0, help='Straggler latency multiplier')
+    parser.add_argument('--percentiles', default='90,95', help='Comma-separated hedge percentiles to compare')
+    parser.add_argument('--budget', type=float, default=0.1, help='Extra requests allowed per call (0..1)')
+    args = parser.parse_args()
+
+    print(f'{args.requests} requests, concurrency {args.concurrency}, median {args.median_ms:.0f} ms, '
+          f'{args.slow_prob:.0%} stragglers at {args.slow_factor:.0f}x, hedge budget {args.budget:.0%}')
+    print(f"{'config':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'mean ms':>8} "
+          f"{'extra load':>10} {'hedged':>7} {'wins':>5}")
+    configs = [('no hedging', Hedger(enabled=False))]
+    configs += [(f'p{p} hedge', Hedger(enabled=True, percentile=float(p), budget=args.budget,
+                                       initial_delay=args.median_ms * 3 / 1e3, min_samples=50))
+                for p in args.percentiles.split(',')]
+    for name, hedger in configs:
+        client = SlowTailRetrieveClient(args.median_ms / 1e3, args.sigma, args.slow_prob, args.slow_factor)
+        latencies = run(hedger, client, args.requests, args.concurrency)
+        stats = hedger.stats()
+        row = [percentile(latencies, p) * 1e3 for p in (50, 95, 99, 100)] + [statistics.mean(latencies) * 1e3]
+        extra = client.calls / args.requests - 1.0
+        print(f'{name:>12} ' + ' '.join(f'{v:8.1f}' for v in row)
+              + f' {extra:>10.1%} {stats["hedged"]:>7} {stats["hedge_wins"]:>5}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Guard cold-start import time of the app and the scripts.
+
+Each target is run in a fresh interpreter under `python -X importtime`; the
+per-module lines written to stderr are parsed and the cumulative time of the
+top-level imports is summed. Targets are executed without running their
+`main()` (scripts are loaded with `runpy` under a non-`__main__` name, and
+`app.py` runs in Streamlit's bare mode, which makes no AWS calls).
+
+The script exits non-zero when the median of `--runs` measurements exceeds a
+target's budget, so it can gate CI.
+
+Usage:
+  python scripts/bench_import_time.py
+  python scripts/bench_import_time.py --runs 5 --top 8
+  python scripts/bench_import_time.py --budget-scale 1.5   # slower machine
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# target -> import budget in milliseconds. The app budget is dominated by
+# streamlit itself; the rest must not pull in boto3, numpy or asyncio eagerly.
+BUDGETS_MS = {
+    'bedrock_utils': 50,
+    'app.py': 600,
+    'scripts/bedrock_sync.py': 30,
+    'scripts/batch_generate.py': 30,
+    'scripts/diagnose_kb.py': 30,
+    'scripts/query_chunks_like.py': 30,
+    'scripts/run_sql_rdsdata.py': 30,
+    'scripts/upload_s3.py': 30,
+    'scripts/train_preclassifier.py': 30,
+}
+
+
+def _code(target):
+    if target.endswith('.py'):
+        return f"import runpy; runpy.run_path({str(ROOT / target)!r}, run_name='__import_bench__')"
+    return f'import {target}'
+
+
+def parse_importtime(stderr):
+    """Return {top-level module: cumulative us} from `-X importtime` output."""
+    top = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        # Nested imports are indented under their importer; keep only the outermost.
+        if name.startswith(' ') and not name.startswith('  '):
+            top[name.strip()] = top.get(name.strip(), 0) + int(cumulative)
+    return top
+
+
+def measure(code, startup=()):
+    """Time `code` in a fresh interpreter, ignoring modules loaded by interpreter start-up."""
+    cmd = [sys.executable, '-X', 'importtime', '-c', code]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(ROOT), check=False)
+    return {name: us for name, us in parse_importtime(proc.stderr).items() if name not in startup}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3, help='Measurements per target (median is reported)')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest top-level imports to list per target')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='Multiply every budget by this factor')
+    parser.add_argument('targets', nargs='*', help='Subset of targets to measure (default: all)')
+    args = parser.parse_args()
+
+    targets = args.targets or list(BUDGETS_MS)
+    # site, encodings, ... are paid by every interpreter and are not ours to optimize.
+    startup = set(measure('pass'))
+    failures = []
+    for target in targets:
+        runs = [measure(_code(target), startup) for _ in range(args.runs)]
+        totals_ms = [sum(r.values()) / 1000.0 for r in runs]
+        median_ms = statistics.median(totals_ms)
+        budget_ms = BUDGETS_MS.get(target, float('inf')) * args.budget_scale
+        ok = median_ms <= budget_ms
+        if not ok:
+            failures.append(target)
+        print(f"{'OK  ' if ok else 'FAIL'} {target:32} {median_ms:8.1f} ms (budget {budget_ms:.0f} ms)")
+        heaviest = sorted(runs[-1].items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+        for name, us in heaviest:
+            print(f'       {us / 1000.0:8.1f} ms  {name}')
+
+    if failures:
+        print(f"Import-time budget exceeded: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
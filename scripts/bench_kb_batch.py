@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark `query_knowledge_base_batch` throughput against a local stub.
+
+The stub `retrieve` sleeps for a fixed latency and raises ThrottlingException
+when more than `--capacity` calls are in flight, mimicking a service quota.
+Throughput is reported for a range of `max_concurrency` values; no AWS calls
+are made.
+
+Usage:
+  python scripts/bench_kb_batch.py
+  python scripts/bench_kb_batch.py --queries 400 --latency-ms 80 --capacity 12
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import bedrock_utils
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from botocore.exceptions import ClientError
+from bedrock_utils import invalidate_retrieval_cache, query_knowledge_base_batch
+from rate_limit import limiter_for, rate_limits
+
+
+class StubRetrieveClient:
+    def __init__(self, latency_s, capacity):
+        self.latency_s = latency_s
+        self.capacity = capacity
+        self.in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        with self._lock:
+            self.in_flight += 1
+            over = self.in_flight > self.capacity
+            if over:
+                self.in_flight -= 1
+                self.throttled += 1
+        if over:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'Retrieve')
+        try:
+            time.sleep(self.latency_s)
+            n = retrievalConfiguration['vectorSearchConfiguration']['numberOfResults']
+            return {'retrievalResults': [
+                {'content': {'text': f"{retrievalQuery['text']} #{i}"}, 'score': 1.0 - i / 10}
+                for i in range(n)
+            ]}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--capacity', type=int, default=16, help='Concurrent calls the stub accepts before throttling')
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help='Comma-separated max_concurrency values')
+    args = parser.parse_args()
+
+    queries = [f'excavator spec question {i}' for i in range(args.queries)]
+    print(f'{args.queries} queries, stub latency {args.latency_ms:.0f} ms, stub capacity {args.capacity}')
+    print(f"{'concurrency':>11} {'seconds':>8} {'queries/s':>10} {'throttled':>9} {'final limit':>11} {'mean wait ms':>12}")
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        invalidate_retrieval_cache()
+        # Start every run from a fresh shared limiter (its AIMD limit adapts across calls).
+        rate_limits.clear()
+        client = StubRetrieveClient(args.latency_ms / 1e3, args.capacity)
+        start = time.perf_counter()
+        results = query_knowledge_base_batch(queries, 'STUBKB', max_concurrency=concurrency, client=client)
+        elapsed = time.perf_counter() - start
+        assert [r[0].text.split(' #')[0] for r in results] == queries, 'results out of order'
+        stats = limiter_for('retrieve').stats()
+        print(f'{concurrency:>11} {elapsed:>8.2f} {len(queries) / elapsed:>10.1f} {client.throttled:>9} '
+              f'{stats["limit"]:>11} {stats["wait_s_mean"] * 1e3:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
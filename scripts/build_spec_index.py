@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Build the structured spec index from the spec-sheet PDFs and try questions against it.
+
+The index holds one (model, attribute, value, unit) record per spec-table row
+(see spec_index.py) and is what the app's local fast path answers from. The
+app rebuilds it on its own when the PDFs are newer; run this after adding
+sheets, to inspect the records, or to time the resolver.
+
+Usage:
+  python scripts/build_spec_index.py
+  python scripts/build_spec_index.py --show X950
+  python scripts/build_spec_index.py --ask "fuel tank size of the MC750" --ask "how heavy is the forklift?"
+  python scripts/build_spec_index.py --bench 10000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import spec_index
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+SAMPLE_QUESTIONS = [
+    'What is the fuel tank size of the MC750 crane?',
+    'Operating weight of the X950 excavator',
+    'How many cylinders does the BD850 have?',
+    'max lift of MC750',
+    'What is the payload capacity of the DT1000?',
+    'How heavy is the forklift?',
+    'Compare the X950 and the MC750 for lifting pipe.',
+    'What hydraulic pressure does the X950 run at?',
+]
+
+
+def main():
+    from spec_index import SPEC_INDEX_PATH, SPEC_SHEETS_DIR, build_index
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=SPEC_SHEETS_DIR, help='Folder of spec-sheet PDFs')
+    parser.add_argument('--output', default=SPEC_INDEX_PATH, help='Index file to write')
+    parser.add_argument('--show', metavar='MODEL', help='Print the records of one model')
+    parser.add_argument('--ask', action='append', help='Question to resolve (repeatable; default: samples)')
+    parser.add_argument('--bench', type=int, metavar='N', help='Time N resolver lookups over the questions')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.input)
+    index.save(args.output)
+    stats = index.stats()
+    print(f"{stats['records']} records for {stats['models']} models in {time.perf_counter() - start:.2f}s "
+          f"-> {args.output}")
+
+    if args.show:
+        for record in index.records.values():
+            if record.model == args.show.upper():
+                unit = f' {record.unit}' if record.unit else ''
+                print(f'  [{record.section}] {record.attribute} = {record.value}{unit}   ({record.text})')
+
+    questions = args.ask or SAMPLE_QUESTIONS
+    for question in questions:
+        record = index.match(question)
+        print(f'  {question}\n    -> ' + (f'{record.model} {record.label}: {record.text}' if record
+                                          else 'no local answer (goes to Bedrock)'))
+
+    if args.bench:
+        start = time.perf_counter()
+        for i in range(args.bench):
+            index.match(questions[i % len(questions)])
+        elapsed = time.perf_counter() - start
+        print(f'{args.bench} lookups in {elapsed * 1000:.1f} ms ({elapsed / args.bench * 1e6:.1f} us per lookup)')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,9 +13,14 @@ import json
 import subprocess
 from pathlib import Path
 import sys
-import boto3
 from botocore.exceptions import ClientError
 
+# Ensure project root is on sys.path so we can import bedrock_clients
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_clients import get_client
+
 
 def get_terraform_output(key, default=None):
     try:
@@ -48,7 +53,7 @@ def pretty_print(obj):
 
 
 def inspect_kb_retrieval(kb_id, query_text, region):
-    client = boto3.client('bedrock-agent-runtime', region_name=region)
+    client = get_client('bedrock-agent-runtime', region_name=region)
     print(f"Calling Bedrock Agent retrieve for KB '{kb_id}' with query: '{query_text}'")
     try:
         resp = client.retrieve(
@@ -66,7 +71,7 @@ def list_s3_objects(bucket_name, region):
     if not bucket_name:
         print("No S3 bucket name provided; skipping S3 listing.")
         return
-    s3 = boto3.client('s3', region_name=region)
+    s3 = get_client('s3', region_name=region)
     print(f"Listing objects in bucket: {bucket_name}")
     try:
         paginator = s3.get_paginator('list_objects_v2')
@@ -84,7 +89,7 @@ def query_aurora_chunks(resource_arn, secret_arn, database, region):
     if not resource_arn or not secret_arn:
         print("Missing RDS resourceArn or secretArn; skipping Aurora query.")
         return
-    client = boto3.client('rds-data', region_name=region)
+    client = get_client('rds-data', region_name=region)
     sql = (
         "SELECT id, left(chunks, 1000) as preview, length(chunks) as len "
         "FROM bedrock_integration.bedrock_kb LIMIT 10;"
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Offline evaluation of `route_model` against fixed-model baselines.
+
+Each question is routed with its recorded (or assumed) classification and
+retrieval scores, and the latency and cost of answering it are estimated from
+per-model profiles (time to first token, output tokens/s) and on-demand prices
+(`metrics.MODEL_PRICES_PER_MTOK`). No AWS calls are made. The report compares
+the router with always-fast and always-strong policies and, for labelled
+questions, how many hard ones stayed on the fast model.
+
+Input JSONL (one object per line; only "question" is required):
+  {"question": "...", "label": "easy"|"hard", "scores": [0.71, 0.64],
+   "classification": {"category": "E", "raw": "Category E", "source": "llm"}, "output_tokens": 300}
+
+Usage:
+  python scripts/eval_routing.py                      # built-in sample questions
+  python scripts/eval_routing.py --input turns.jsonl --baseline fast
+  python scripts/eval_routing.py --threshold 0.8 --context-tokens 2500
+"""
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import bedrock_utils
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_utils import FAST_MODEL, STRONG_MODEL, ROUTING_THRESHOLD, RetrievedChunk, route_model
+from context_packing import estimate_tokens
+from metrics import estimate_cost
+from preclassifier import preclassify
+
+# Assumed (time to first token in s, output tokens per s); measure yours with the metrics sink.
+MODEL_PROFILES = {
+    FAST_MODEL: (0.35, 120.0),
+    STRONG_MODEL: (0.90, 55.0),
+}
+
+SAMPLE = [
+    ('What is the bucket capacity of the X950?', 'easy', [0.78, 0.66]),
+    ('How much does the DT1000 weigh?', 'easy', [0.74, 0.70]),
+    ('What engine does the BD850 bulldozer use?', 'easy', [0.69, 0.61]),
+    ('Max lifting height of the FL250 forklift?', 'easy', [0.72, 0.58]),
+    ('What is the fuel tank size of the MC750 crane?', 'easy', [0.67, 0.60]),
+    ('Operating weight of the X950 excavator', 'easy', [0.75, 0.63]),
+    ('Blade width on the BD850?', 'easy', [0.64, 0.52]),
+    ('What is the top speed of the DT1000 dump truck?', 'easy', [0.70, 0.55]),
+    ('Does the FL250 have a side shift?', 'easy', [0.48, 0.44]),
+    ('What hydraulic pressure does the X950 run at?', 'easy', [0.66, 0.62]),
+    ('Compare the X950 and the MC750 for lifting pipe on a pipeline job.', 'hard', [0.58, 0.55]),
+    ('Which is better for a small quarry, the BD850 bulldozer or the X950 excavator, and why?', 'hard',
+     [0.61, 0.57]),
+    ('Should I rent a DT1000 or two smaller haul trucks for moving 20,000 tons of gravel over three months '
+     'on a site with steep ramps and limited turning space?', 'hard', [0.52, 0.49]),
+    ('Explain the trade-offs between the FL250 forklift and a telehandler for unloading steel beams.', 'hard',
+     [0.44, 0.40]),
+    ('What are the differences in fuel consumption between the X950 and BD850 at full load?', 'hard',
+     [0.63, 0.60]),
+    ('Recommend a machine for clearing snow from a large parking lot overnight.', 'hard', [0.39, 0.35]),
+]
+
+
+def load_questions(path):
+    if path is None:
+        return [{'question': q, 'label': label, 'scores': scores} for q, label, scores in SAMPLE]
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def estimate_turn(model_id, input_tokens, output_tokens):
+    ttft, tokens_per_s = MODEL_PROFILES.get(model_id, MODEL_PROFILES[STRONG_MODEL])
+    latency = ttft + output_tokens / tokens_per_s
+    cost = estimate_cost({'model_id': model_id, 'input_tokens': input_tokens, 'output_tokens': output_tokens})
+    return latency, cost or 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help='JSONL of questions (default: built-in sample)')
+    parser.add_argument('--threshold', type=float, default=ROUTING_THRESHOLD, help='Escalation score threshold')
+    parser.add_argument('--baseline', choices=('fast', 'strong'), default='strong',
+                        help='Fixed-model policy to report savings against')
+    parser.add_argument('--context-tokens', type=int, default=1500, help='Retrieved context sent with each question')
+    parser.add_argument('--output-tokens', type=int, default=250, help='Answer length when not recorded')
+    parser.add_argument('--verbose', action='store_true', help='Print the decision for every question')
+    args = parser.parse_args()
+
+    rows = load_questions(args.input)
+    policies = {'fixed fast': [], 'fixed strong': [], 'routed': []}
+    escalated = 0
+    hard_total = hard_on_fast = easy_on_strong = 0
+    for row in rows:
+        question = row['question']
+        classification = (row.get('classification') or preclassify(question)
+                          or {'category': 'E', 'raw': 'Category E', 'source': 'llm'})
+        results = [RetrievedChunk(None, '', score, None, {}) for score in row.get('scores') or ()]
+        decision = route_model(question, classification, results, threshold=args.threshold)
+        escalated += decision.escalated
+        if row.get('label') == 'hard':
+            hard_total += 1
+            hard_on_fast += not decision.escalated
+        elif row.get('label') == 'easy':
+            easy_on_strong += decision.escalated
+        if args.verbose:
+            print(f"{'STRONG' if decision.escalated else 'fast  '} {decision.score:5.2f} "
+                  f"[{row.get('label', '?')}] {question[:70]}  ({', '.join(decision.reasons)})")
+
+        input_tokens = estimate_tokens(question) + args.context_tokens
+        output_tokens = row.get('output_tokens') or args.output_tokens
+        for name, model in (('fixed fast', FAST_MODEL), ('fixed strong', STRONG_MODEL),
+                            ('routed', decision.model_id)):
+            policies[name].append(estimate_turn(model, input_tokens, output_tokens))
+
+    print(f'{len(rows)} questions, threshold {args.threshold}, {escalated} escalated '
+          f'({escalated / len(rows):.0%}) to {STRONG_MODEL}')
+    print(f"{'policy':>12} {'mean s':>7} {'p95 s':>7} {'$ per 1k':>9}")
+    summary = {}
+    for name, turns in policies.items():
+        latencies = sorted(t[0] for t in turns)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        cost_per_1k = sum(t[1] for t in turns) / len(turns) * 1000
+        summary[name] = (statistics.mean(latencies), cost_per_1k)
+        print(f'{name:>12} {summary[name][0]:>7.2f} {p95:>7.2f} {cost_per_1k:>9.2f}')
+
+    base_latency, base_cost = summary[f'fixed {args.baseline}']
+    routed_latency, routed_cost = summary['routed']
+    print(f'routed vs fixed {args.baseline}: latency {routed_latency / base_latency - 1:+.0%}, '
+          f'cost {routed_cost / base_cost - 1:+.0%}')
+    if hard_total:
+        print(f'hard questions kept on the fast model: {hard_on_fast}/{hard_total}; '
+              f'easy questions escalated: {easy_on_strong}')
+
+
+if __name__ == '__main__':
+    main()
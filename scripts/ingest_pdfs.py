@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Extract and chunk the spec-sheet PDFs locally, writing JSONL chunks.
+
+PDFs are parsed in a process pool (one document per task). Each worker
+streams its document page by page through `ingestion.chunk_pages` into a
+part file, and the parent appends finished parts to the output in input
+order, so neither side holds a whole document in memory. Every output line
+is one chunk:
+
+  {"id": "excavator-x950-spec-sheet.pdf#3", "source": "excavator-x950-spec-sheet.pdf",
+   "chunk_index": 3, "section": "HYDRAULIC SYSTEM", "pages": [3, 4], "has_table": true,
+   "tokens": 287, "text": "..."}
+
+`--bench` runs the pipeline with 1..N workers over the corpus (repeated
+`--repeat` times so runs are long enough to time) and reports pages per second
+and pages per second per core; chunks are discarded.
+
+Usage:
+  python scripts/ingest_pdfs.py --output chunks.jsonl
+  python scripts/ingest_pdfs.py --chunk-tokens 400 --overlap-tokens 60 --workers 4 > chunks.jsonl
+  python scripts/ingest_pdfs.py --bench --repeat 10
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import ingestion
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spec-sheets')
+
+
+def process_pdf(path, source, part_path, max_tokens, overlap_tokens):
+    """Chunk one PDF into `part_path`; returns (pages, chunks, CPU seconds)."""
+    from ingestion import chunk_pages, iter_pdf_pages
+
+    start = time.process_time()
+    pages = chunks = 0
+
+    def counted(page_texts):
+        nonlocal pages
+        for text in page_texts:
+            pages += 1
+            yield text
+
+    with open(part_path, 'w', encoding='utf-8') as out:
+        for index, chunk in enumerate(chunk_pages(counted(iter_pdf_pages(path)), max_tokens, overlap_tokens)):
+            record = {
+                'id': f'{source}#{index}',
+                'source': source,
+                'chunk_index': index,
+                'section': chunk.section,
+                'pages': [chunk.page_start, chunk.page_end],
+                'has_table': chunk.has_table,
+                'tokens': chunk.tokens,
+                'text': chunk.text,
+            }
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            chunks += 1
+    return pages, chunks, time.process_time() - start
+
+
+def find_pdfs(input_path):
+    if os.path.isdir(input_path):
+        return sorted(glob.glob(os.path.join(input_path, '**', '*.pdf'), recursive=True)), input_path
+    return sorted(glob.glob(input_path)), os.path.dirname(input_path) or '.'
+
+
+def ingest(paths, root, out, workers, max_tokens, overlap_tokens):
+    """Chunk `paths` into the open text stream `out`; returns (pages, chunks, wall s, CPU s)."""
+    pages = chunks = 0
+    cpu = 0.0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='ingest-') as parts, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for i, path in enumerate(paths):
+            source = os.path.relpath(path, root).replace('\\', '/')
+            part_path = os.path.join(parts, f'{i}.jsonl')
+            futures.append((pool.submit(process_pdf, path, source, part_path, max_tokens, overlap_tokens),
+                            source, part_path))
+        for future, source, part_path in futures:
+            try:
+                doc_pages, doc_chunks, doc_cpu = future.result()
+            except Exception as e:
+                print(f'Error processing {source}: {e}', file=sys.stderr)
+                continue
+            with open(part_path, 'r', encoding='utf-8') as part:
+                shutil.copyfileobj(part, out)
+            os.remove(part_path)
+            pages += doc_pages
+            chunks += doc_chunks
+            cpu += doc_cpu
+    return pages, chunks, time.perf_counter() - start, cpu
+
+
+def bench(paths, root, max_workers, repeat, max_tokens, overlap_tokens):
+    paths = paths * repeat
+    cores = os.cpu_count() or 1
+    print(f'{len(paths)} documents ({repeat}x corpus), {cores} CPU(s)')
+    print(f"{'workers':>7} {'pages':>6} {'chunks':>7} {'wall s':>7} {'pages/s':>8} {'pages/s/core':>13} "
+          f"{'pages/cpu-s':>12}")
+    for workers in range(1, max_workers + 1):
+        with open(os.devnull, 'w', encoding='utf-8') as out:
+            pages, chunks, wall, cpu = ingest(paths, root, out, workers, max_tokens, overlap_tokens)
+        rate = pages / wall if wall else 0.0
+        print(f'{workers:>7} {pages:>6} {chunks:>7} {wall:>7.2f} {rate:>8.1f} '
+              f'{rate / min(workers, cores):>13.1f} {pages / cpu if cpu else 0.0:>12.1f}')
+
+
+def main():
+    from ingestion import DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=DEFAULT_INPUT, help='Folder (searched recursively) or glob of PDFs')
+    parser.add_argument('--output', default='-', help='JSONL output file (default: stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help='Maximum tokens per chunk')
+    parser.add_argument('--overlap-tokens', type=int, default=DEFAULT_OVERLAP_TOKENS,
+                        help='Trailing prose tokens repeated at the start of the next chunk')
+    parser.add_argument('--bench', action='store_true', help='Benchmark 1..--workers workers; no output')
+    parser.add_argument('--repeat', type=int, default=5, help='Corpus repetitions in --bench')
+    args = parser.parse_args()
+
+    paths, root = find_pdfs(args.input)
+    if not paths:
+        print(f'No PDFs found under {args.input}', file=sys.stderr)
+        sys.exit(2)
+    if args.bench:
+        bench(paths, root, max(1, args.workers), max(1, args.repeat), args.chunk_tokens, args.overlap_tokens)
+        return
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        pages, chunks, wall, _cpu = ingest(paths, root, out, max(1, args.workers), args.chunk_tokens,
+                                           args.overlap_tokens)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f'{len(paths)} documents, {pages} pages, {chunks} chunks in {wall:.2f}s '
+          f'({pages / wall if wall else 0.0:.1f} pages/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
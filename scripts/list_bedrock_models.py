@@ -1,7 +1,14 @@
-import boto3
 import json
+import sys
+from pathlib import Path
 
-client = boto3.client('bedrock')
+# Ensure project root is on sys.path so we can import bedrock_clients
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_clients import get_client
+
+client = get_client('bedrock')
 
 print('Trying to list models via different APIs...')
 
@@ -12,9 +12,14 @@ import json
 import subprocess
 from pathlib import Path
 import sys
-import boto3
 from botocore.exceptions import ClientError
 
+# Ensure project root is on sys.path so we can import bedrock_clients
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_clients import get_client
+
 
 def get_terraform_output(key, default=None):
     try:
@@ -47,7 +52,7 @@ def main():
         print('Missing RDS ARNs; set RDS_RESOURCE_ARN and RDS_SECRET_ARN in env or ensure terraform outputs are present.')
         sys.exit(2)
 
-    client = boto3.client('rds-data', region_name=region)
+    client = get_client('rds-data', region_name=region)
     # Use ILIKE for case-insensitive search; return id and a snippet around the match
     sql = (
         "SELECT id, length(chunks) as len, left(chunks, 2000) as preview "
@@ -15,10 +15,15 @@ import os
 import sys
 import json
 import subprocess
-import boto3
 from botocore.exceptions import ClientError
 from pathlib import Path
 
+# Ensure project root is on sys.path so we can import bedrock_clients
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_clients import get_client
+
 # Configuration (read from Terraform outputs, or override with env vars)
 def get_terraform_output(key, default=None):
     """Try to read Terraform output from stack1; fallback to env var then default.
@@ -111,7 +116,7 @@ def main():
     print(f"DEBUG: REGION = {REGION}")
     sys.stdout.flush()
 
-    client = boto3.client('rds-data', region_name=REGION)
+    client = get_client('rds-data', region_name=REGION)
 
     for idx, stmt in enumerate(statements, start=1):
         print(f"\n--- Statement {idx}/{len(statements)} (first 120 chars):\n{stmt[:120]}\n---")
@@ -0,0 +1,108 @@
+"""Exercise follow-up handling in app.py with streamlit's AppTest and fake Bedrock clients (no AWS calls).
+
+Checks that a short follow-up is retrieved together with the previous
+question but classified on its own, so an off-topic prompt after a machinery
+question is still rejected by the classifier and not remembered, and that a
+real follow-up is accepted and retrieved with the previous question.
+
+Usage:
+  python scripts/test_followups.py
+"""
+import json
+import re
+import sys
+import zlib
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import app and bedrock_utils
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from streamlit.testing.v1 import AppTest
+
+import bedrock_utils
+from conversation import ConversationMemory
+from preclassifier import preclassify
+
+MACHINERY_RE = re.compile(r'\b(?:x950|bd850|excavator|bulldozer|weigh\w*)\b', re.I)
+
+
+class FakeRuntime:
+    """Classifier, embedder and answer stream; records every prompt it classifies."""
+
+    def __init__(self):
+        self.classified = []
+
+    def invoke_model(self, modelId, body, **kwargs):
+        payload = json.loads(body)
+        if 'inputText' in payload:
+            # Bag-of-words embedding: identical word sets give identical vectors.
+            vector = [0.0] * 64
+            for word in re.findall(r'[a-z0-9]+', payload['inputText'].lower()):
+                vector[zlib.crc32(word.encode()) % 64] += 1.0
+            data = {'embedding': vector}
+        else:
+            prompt = payload['messages'][-1]['content'][0]['text']
+            self.classified.append(prompt)
+            data = {'content': [{'text': 'Category E' if MACHINERY_RE.search(prompt) else 'Category C'}]}
+        return {'body': json.dumps(data).encode('utf-8')}
+
+    def invoke_model_with_response_stream(self, body, **kwargs):
+        prompt = json.loads(body)['messages'][-1]['content'][0]['text']
+        events = [
+            {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': f'Answer to: {prompt}'}},
+            {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}, 'usage': {'output_tokens': 5}},
+        ]
+        return {'body': [{'chunk': {'bytes': json.dumps(e).encode('utf-8')}} for e in events]}
+
+
+class FakeKB:
+    def __init__(self):
+        self.queries = []
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        self.queries.append(retrievalQuery['text'])
+        return {'retrievalResults': [{'content': {'text': 'X950 operating weight: 89,500 kg'}, 'score': 0.8}]}
+
+
+def main():
+    first = 'How much does the X950 weigh?'
+    poem = 'Write me a poem about the ocean'
+    follow_up = 'and the BD850?'
+
+    # The bug this guards against: the carried-over question makes the poem look in scope.
+    memory = ConversationMemory()
+    memory.add_exchange(first, '89,500 kg')
+    assert memory.standalone_query(poem) != poem
+    assert preclassify(memory.standalone_query(poem))['category'] == 'E' and preclassify(poem) is None
+
+    runtime, kb = FakeRuntime(), FakeKB()
+    bedrock_utils._runtime_client = lambda: runtime
+    bedrock_utils._kb_client = lambda: kb
+
+    at = AppTest.from_file(str(ROOT / 'app.py'), default_timeout=30)
+    at.run()
+    at.sidebar.checkbox[1].uncheck()  # no local spec lookups: every answer goes through Bedrock
+    at.run()
+
+    at.chat_input[0].set_value(first).run()
+    assert at.chat_message[-1].markdown[0].value == f'Answer to: {first}'
+    assert len(at.session_state.memory.turns) == 2
+
+    runtime.classified.clear()
+    at.chat_input[0].set_value(poem).run()
+    assert at.chat_message[-1].markdown[0].value == "I'm unable to answer this, please try again"
+    assert runtime.classified == [poem], runtime.classified
+    assert len(at.session_state.memory.turns) == 2
+
+    kb.queries.clear()
+    at.chat_input[0].set_value(follow_up).run()
+    assert at.chat_message[-1].markdown[0].value == f'Answer to: {follow_up}'
+    assert kb.queries == [f'{first}\n{follow_up}'], kb.queries
+    assert len(at.session_state.memory.turns) == 4
+
+    print('follow-up checks passed')
+
+
+if __name__ == '__main__':
+    main()
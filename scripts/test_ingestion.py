@@ -0,0 +1,60 @@
+"""Exercise ingestion.chunk_pages on synthetic page text (no PDFs needed).
+
+Checks that one long unwrapped paragraph is split between sentences (and a
+run-on sentence between words) so that no chunk exceeds `max_tokens`, that
+no text is lost or duplicated without overlap, that overlap never pushes a
+chunk over the limit, and that the spec table after the paragraph stays whole
+under its heading.
+
+Usage:
+  python scripts/test_ingestion.py
+"""
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import ingestion
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from context_packing import estimate_tokens
+from ingestion import chunk_pages, split_line
+
+SENTENCE = ('The X950 excavator combines a high-output hydraulic system with a reinforced boom, '
+            'giving operators fast cycle times and precise control in heavy digging work.')
+RUN_ON = ' '.join(['and the undercarriage keeps the machine stable on uneven ground'] * 12)
+
+
+def main():
+    paragraph = ' '.join([SENTENCE] * 20 + [RUN_ON + '.'] + [SENTENCE] * 5)
+    page = '\n'.join([
+        'PRODUCT OVERVIEW',
+        paragraph,
+        'ENGINE',
+        'Model: Cat C18',
+        'Net Power (SAE J1349): 634 kW (850 hp)',
+        'Displacement: 18.1 L',
+    ])
+    max_tokens = 120
+    assert estimate_tokens(paragraph) > 5 * max_tokens
+
+    pieces = split_line(paragraph, max_tokens)
+    assert all(estimate_tokens(p) <= max_tokens for p in pieces), [estimate_tokens(p) for p in pieces]
+    assert ' '.join(pieces) == paragraph
+    # Sentences that fit are never cut: every piece outside the run-on ends a sentence.
+    assert all(p.endswith('.') for p in pieces if RUN_ON[:40] not in p), pieces
+
+    chunks = list(chunk_pages([page], max_tokens=max_tokens, overlap_tokens=0))
+    assert all(c.tokens <= max_tokens and estimate_tokens(c.text) <= max_tokens for c in chunks), \
+        [c.tokens for c in chunks]
+    assert ' '.join(c.text for c in chunks).split() == page.split()
+    assert [c.has_table for c in chunks].count(True) == 1 and chunks[-1].text.endswith(page[page.index('ENGINE'):])
+
+    overlapped = list(chunk_pages([page], max_tokens=max_tokens, overlap_tokens=60))
+    assert all(c.tokens <= max_tokens for c in overlapped), [c.tokens for c in overlapped]
+    assert len(overlapped) >= len(chunks)
+
+    print('chunk_pages checks passed')
+
+
+if __name__ == '__main__':
+    main()
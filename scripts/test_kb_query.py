@@ -22,10 +22,7 @@ if not results:
     print(results)
 else:
     for r in results:
-        # defensive printing — some results may not include expected keys
-        doc_id = r.get('documentId') or r.get('id') or '<no-id>'
-        text = r.get('text') or r.get('contents') or ''
-        print('-', doc_id, '-', text[:200])
+        print('-', r.id or '<no-id>', '-', r.source_uri or '', '-', r.text[:200])
 
 print('\nSkipping model generation in this quick test to avoid long calls.\n')
 print('If you want to run generation, re-enable the generation block in this script or run the following in a Python REPL:')
@@ -35,13 +32,11 @@ print("\nfrom bedrock_utils import generate_response\n# build prompt and call ge
 print('\nRunning end-to-end generation using retrieved context (this may incur charges)...')
 context_pieces = []
 for r in results[:3]:
-    text = r.get('text') or r.get('contents') or ''
-    if text:
-        context_pieces.append(text)
+    if r.text:
+        context_pieces.append(r.text)
     else:
         # fall back to metadata or id
-        meta = r.get('metadata') or {}
-        context_pieces.append(json.dumps(meta) if meta else f"DocumentID:{r.get('id')}")
+        context_pieces.append(json.dumps(r.metadata) if r.metadata else f"DocumentID:{r.id}")
 
 context = '\n\n'.join(context_pieces) if context_pieces else 'No contextual passages found.'
 prompt = f"You are a helpful assistant. Use the following context to answer the question.\n\nContext:\n{context}\n\nQuestion: What is the bucket capacity of the excavator X950?"
@@ -0,0 +1,109 @@
+"""Exercise rate_limit.ModelLimiter with fake calls (no AWS calls).
+
+Checks that throttled calls are retried and halve the concurrency limit,
+that transient server and connection errors are retried without shrinking
+it, that other errors are not retried, that a full queue rejects new callers,
+and that async waiters which are cancelled or time out give their queue
+slot back, so the limiter keeps admitting callers afterwards.
+
+Usage:
+  python scripts/test_rate_limit.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import rate_limit
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+import rate_limit
+from rate_limit import ModelLimiter, RateLimitExceeded
+
+
+def throttle():
+    return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+
+
+def check_retries():
+    limiter = ModelLimiter('retries', max_concurrency=8)
+    limiter.backoff = lambda attempt: 0.0
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise throttle()
+        return 'ok'
+
+    assert limiter.call(flaky) == 'ok' and len(calls) == 3
+    assert limiter.limit < 8 and limiter.stats()['throttles'] == 2 and limiter.in_flight == 0
+
+    transient = [ClientError({'Error': {'Code': 'ModelTimeoutException', 'Message': 'timed out'}}, 'InvokeModel'),
+                 ClientError({'Error': {'Code': 'Unknown'}, 'ResponseMetadata': {'HTTPStatusCode': 503}}, 'Retrieve'),
+                 ReadTimeoutError(endpoint_url='https://bedrock-runtime'),
+                 EndpointConnectionError(endpoint_url='https://bedrock-runtime')]
+
+    def unreliable():
+        if transient:
+            raise transient.pop()
+        return 'ok'
+
+    limit = limiter.limit
+    assert limiter.call(unreliable) == 'ok' and not transient
+    assert limiter.limit >= limit and limiter.stats()['throttles'] == 2
+
+    def broken():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    calls.clear()
+    try:
+        limiter.call(broken)
+    except ValueError:
+        pass
+    assert len(calls) == 1 and limiter.in_flight == 0
+
+
+async def check_cancelled_waiters():
+    limiter = ModelLimiter('cancel', max_concurrency=1, max_queue=3, queue_timeout=30)
+    await limiter.aacquire()  # hold the only slot so everyone else queues
+
+    for _ in range(2):
+        waiters = [asyncio.ensure_future(limiter.aacquire()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert limiter.queued == 3
+        try:
+            await limiter.aacquire(timeout=0.01)
+        except RateLimitExceeded:
+            pass
+        else:
+            raise AssertionError('a full queue must reject new callers')
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert limiter.queued == 0, limiter.queued
+
+    # A timed-out waiter gives its slot back too.
+    try:
+        await limiter.aacquire(timeout=0.02)
+    except RateLimitExceeded:
+        pass
+    assert limiter.queued == 0
+
+    limiter.release()
+    await asyncio.wait_for(limiter.aacquire(), timeout=1)
+    assert limiter.in_flight == 1 and limiter.queued == 0
+
+
+def main():
+    check_retries()
+    asyncio.run(check_cancelled_waiters())
+    assert rate_limit.limiter_for('retrieve') is rate_limit.limiter_for('retrieve')
+    print('rate_limit checks passed')
+
+
+if __name__ == '__main__':
+    main()
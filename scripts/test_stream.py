@@ -0,0 +1,119 @@
+"""Exercise bedrock_utils.generate_response_stream against a fake stream body (no AWS calls).
+
+Checks that text deltas are yielded in order, that an in-band error event
+or a ClientError raised mid-stream ends the generator cleanly with the text
+produced so far, that `on_result` receives the usage and stop reason, and
+that the rate-limiter slot is given back in every case.
+
+Usage:
+  python scripts/test_stream.py
+"""
+import json
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import bedrock_utils
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from botocore.exceptions import ClientError
+
+import bedrock_utils
+from rate_limit import limiter_for
+
+MODEL_ID = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+
+def chunk(event):
+    return {'chunk': {'bytes': json.dumps(event).encode('utf-8')}}
+
+
+def anthropic_events(texts, stop_reason='end_turn'):
+    """The event sequence Bedrock streams for an Anthropic messages call."""
+    yield chunk({'type': 'message_start', 'message': {'usage': {'input_tokens': 42, 'output_tokens': 1}}})
+    yield chunk({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+    for text in texts:
+        yield chunk({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': text}})
+    yield chunk({'type': 'content_block_stop', 'index': 0})
+    yield chunk({'type': 'message_delta', 'delta': {'stop_reason': stop_reason}, 'usage': {'output_tokens': 7}})
+    yield chunk({'type': 'message_stop'})
+
+
+class FakeRuntime:
+    """Just enough of the bedrock-runtime client for generate_response_stream."""
+
+    def __init__(self, events):
+        self.events = events
+        self.requests = []
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'body': self.events}
+
+
+def run(events, **kwargs):
+    client = FakeRuntime(events)
+    bedrock_utils._runtime_client = lambda: client
+    results = []
+    deltas = list(bedrock_utils.generate_response_stream('How heavy is the X950?', MODEL_ID, max_tokens=64,
+                                                         on_result=results.append, **kwargs))
+    assert len(results) == 1, results
+    assert limiter_for(MODEL_ID).in_flight == 0
+    return deltas, results[0], client
+
+
+def raising_after(events, count, error):
+    for i, event in enumerate(events):
+        if i == count:
+            raise error
+        yield event
+
+
+def main():
+    deltas, result, client = run(anthropic_events(['The X950 ', 'weighs ', '89,500 kg.']))
+    assert deltas == ['The X950 ', 'weighs ', '89,500 kg.'], deltas
+    assert result.text == 'The X950 weighs 89,500 kg.' and result.error is None
+    assert (result.input_tokens, result.output_tokens, result.stop_reason) == (42, 7, 'end_turn'), result
+    assert result.operation == 'stream' and result.first_token_s is not None
+    assert json.loads(client.requests[0]['body'])['max_tokens'] == 64
+
+    deltas, result, _ = run(anthropic_events(['The X950 weighs'], stop_reason='max_tokens'))
+    assert deltas == ['The X950 weighs'] and result.stop_reason == 'max_tokens' and result.error is None
+
+    # Modeled stream errors arrive in-band as an event without a chunk.
+    events = list(anthropic_events(['The X950 ', 'weighs ']))[:4]
+    events.append({'modelStreamErrorException': {'message': 'model stream failed'}})
+    events += list(anthropic_events(['never yielded']))
+    deltas, result, _ = run(iter(events))
+    assert deltas == ['The X950 ', 'weighs '], deltas
+    assert result.text == 'The X950 weighs ' and 'modelStreamErrorException' in result.error
+    assert result.stop_reason is None
+
+    # A throttle in-band also halves the limiter's concurrency limit.
+    limit = limiter_for(MODEL_ID).limit
+    deltas, result, _ = run(iter([{'throttlingException': {'message': 'slow down'}}]))
+    assert deltas == [] and result.text is None and 'throttlingException' in result.error
+    assert limiter_for(MODEL_ID).limit == max(1.0, limit / 2)
+
+    # The event stream itself failing mid-iteration ends the generator the same way.
+    error = ClientError({'Error': {'Code': 'ModelStreamErrorException', 'Message': 'connection reset'}},
+                        'InvokeModelWithResponseStream')
+    deltas, result, _ = run(raising_after(anthropic_events(['The X950 ', 'weighs ']), 3, error))
+    assert deltas == ['The X950 '], deltas
+    assert result.text == 'The X950 ' and 'connection reset' in result.error
+
+    # Closing the generator early (the consumer stopped reading) still reports the result.
+    client = FakeRuntime(anthropic_events(['one ', 'two ', 'three']))
+    bedrock_utils._runtime_client = lambda: client
+    results = []
+    stream = bedrock_utils.generate_response_stream('q', MODEL_ID, on_result=results.append)
+    assert next(stream) == 'one '
+    stream.close()
+    assert len(results) == 1 and results[0].text == 'one ' and results[0].stop_reason is None
+    assert limiter_for(MODEL_ID).in_flight == 0
+
+    print('generate_response_stream checks passed')
+
+
+if __name__ == '__main__':
+    main()
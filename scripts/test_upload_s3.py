@@ -0,0 +1,117 @@
+"""Exercise upload_s3.upload_files_to_s3 against an in-memory S3 stand-in (no AWS calls).
+
+Checks that a first run uploads everything, a second run skips everything,
+touched-but-identical files are re-hashed but not uploaded, edited files are
+re-uploaded, a lost manifest is rebuilt from object ETags, and multipart
+ETags computed locally match what S3 would report.
+
+Usage:
+  python scripts/test_upload_s3.py
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import upload_s3
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+
+from botocore.exceptions import ClientError
+
+import upload_s3
+
+# Small parts so the multipart ETag path runs on small files.
+upload_s3.MULTIPART_THRESHOLD = upload_s3.MULTIPART_CHUNKSIZE = 64 * 1024
+upload_s3.HASH_BLOCK = 16 * 1024
+
+
+class LocalS3:
+    """Just enough of the S3 client for upload_files_to_s3, with S3's ETag rules."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = 0
+        self.heads = 0
+        self._lock = threading.Lock()
+
+    def upload_file(self, filename, bucket, key, Config=None, Callback=None):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if len(data) < Config.multipart_threshold:
+            etag = hashlib.md5(data).hexdigest()
+        else:
+            size = Config.multipart_chunksize
+            parts = [hashlib.md5(data[i:i + size]).digest() for i in range(0, len(data), size)]
+            etag = f'{hashlib.md5(b"".join(parts)).hexdigest()}-{len(parts)}'
+        with self._lock:
+            self.objects[(bucket, key)] = (data, etag)
+            self.uploads += 1
+        if Callback:
+            Callback(len(data))
+
+    def head_object(self, Bucket, Key):
+        with self._lock:
+            self.heads += 1
+            obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return {'ETag': f'"{obj[1]}"', 'ContentLength': len(obj[0])}
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'docs')
+        manifest = os.path.join(tmp, 'manifest.json')
+        write(os.path.join(folder, 'small.txt'), b'bucket capacity 1.2 m3\n')
+        write(os.path.join(folder, 'sub', 'big.pdf'), os.urandom(200 * 1024))
+        write(os.path.join(folder, 'exact.pdf'), os.urandom(128 * 1024))
+        s3 = LocalS3()
+
+        def run(**kwargs):
+            return upload_s3.upload_files_to_s3(folder, 'bucket', 'spec-sheets', workers=4,
+                                                manifest_path=manifest, s3_client=s3, **kwargs)
+
+        report = run()
+        assert sorted(report.added) == ['spec-sheets/exact.pdf', 'spec-sheets/small.txt', 'spec-sheets/sub/big.pdf']
+        assert s3.uploads == 3 and not report.failed
+        for (_bucket, key), (_data, etag) in s3.objects.items():
+            local = os.path.join(folder, key.split('/', 1)[1])
+            assert upload_s3.file_digests(local)[1] == etag, key
+        assert s3.objects[('bucket', 'spec-sheets/sub/big.pdf')][1].endswith('-4')
+
+        report = run()
+        assert len(report.unchanged) == 3 and s3.uploads == 3
+
+        # New mtime, same bytes: re-hashed, not uploaded.
+        os.utime(os.path.join(folder, 'small.txt'), ns=(0, 10 ** 18))
+        report = run()
+        assert len(report.unchanged) == 3 and s3.uploads == 3
+
+        write(os.path.join(folder, 'small.txt'), b'bucket capacity 1.4 m3\n')
+        report = run()
+        assert report.changed == ['spec-sheets/small.txt'] and s3.uploads == 4
+
+        # Lost manifest: every file is checked against its ETag instead of re-uploaded.
+        os.remove(manifest)
+        heads = s3.heads
+        report = run()
+        assert len(report.unchanged) == 3 and s3.uploads == 4 and s3.heads == heads + 3
+
+        report = run(force=True)
+        assert len(report.changed) == 3 and s3.uploads == 7
+
+    print('upload_s3 checks passed')
+
+
+if __name__ == '__main__':
+    main()
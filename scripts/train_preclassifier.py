@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Train the hashed n-gram model used by `preclassifier.preclassify`.
+
+Input is JSONL with one labeled prompt per line:
+  {"prompt": "What is the lift capacity of the MC750?", "category": "E"}
+
+Usage:
+  python scripts/train_preclassifier.py --data labeled_prompts.jsonl --out preclassifier_model.json
+  # then point the app at it
+  export BEDROCK_PRECLASSIFIER_MODEL=preclassifier_model.json
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so we can import preclassifier
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from preclassifier import HashedNgramModel
+
+
+def load_examples(path):
+    examples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            examples.append((row['prompt'], str(row['category']).upper() == 'E'))
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', required=True, help='JSONL file of {"prompt", "category"} rows')
+    parser.add_argument('--out', required=True, help='Where to write the model JSON')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--lr', type=float, default=0.5)
+    parser.add_argument('--holdout', type=float, default=0.2, help='Fraction held out for evaluation')
+    args = parser.parse_args()
+
+    examples = load_examples(args.data)
+    random.Random(0).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train, test = examples[:split], examples[split:]
+
+    model = HashedNgramModel()
+    model.train(train, epochs=args.epochs, lr=args.lr)
+    model.save(args.out)
+    print(f'Trained on {len(train)} prompts; wrote {args.out}')
+
+    if test:
+        correct = sum((model.predict_proba(text) >= 0.5) == label for text, label in test)
+        print(f'Holdout accuracy: {correct / len(test):.3f} ({len(test)} prompts)')
+
+
+if __name__ == '__main__':
+    main()
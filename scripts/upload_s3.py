@@ -1,40 +1,264 @@
+"""Upload a folder of source documents to S3, skipping files that have not changed.
+
+Files are uploaded concurrently (a thread pool across files, and boto3's
+multipart transfer within large files). A local manifest records each
+uploaded file's size, mtime, MD5 and expected S3 ETag, so later runs only
+hash files whose size or mtime moved and only upload files whose content
+changed. Files without a manifest entry (first run, or a lost manifest) are
+checked against the object's ETag with `head_object` before uploading;
+`--verify-etag` does the same for every unchanged file.
+
+Usage:
+  python scripts/upload_s3.py
+  python scripts/upload_s3.py --folder scripts/spec-sheets --bucket my-bucket --prefix spec-sheets --workers 16
+  python scripts/upload_s3.py --verify-etag     # also check unchanged files against S3
+  python scripts/upload_s3.py --force           # upload everything
+"""
+import argparse
+import hashlib
+import json
 import os
-import boto3
-from botocore.exceptions import ClientError
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ensure project root is on sys.path so we can import bedrock_clients
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bedrock_clients import get_client
+from kb_sync_state import STATE_DIR
+
+MB = 1024 * 1024
+# Multipart settings; the local ETag computation below must use the same part size.
+MULTIPART_THRESHOLD = 16 * MB
+MULTIPART_CHUNKSIZE = 16 * MB
+PER_FILE_CONCURRENCY = 4
+HASH_BLOCK = 1 * MB
+
+
+def transfer_config(per_file_concurrency: int = PER_FILE_CONCURRENCY) -> Any:
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=per_file_concurrency,
+        use_threads=True,
+    )
+
+
+def file_digests(path: str) -> Tuple[str, str]:
+    """Return (MD5 hex, expected S3 ETag) for `path` uploaded with the settings above.
+
+    Single-part uploads get the MD5 as ETag; multipart uploads get the MD5 of
+    the concatenated part MD5s followed by "-<parts>".
+    """
+    whole = hashlib.md5()
+    part_digests: List[bytes] = []
+    part = hashlib.md5()
+    part_filled = 0
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            size += len(block)
+            whole.update(block)
+            # HASH_BLOCK divides MULTIPART_CHUNKSIZE, so parts end on block boundaries.
+            part.update(block)
+            part_filled += len(block)
+            if part_filled == MULTIPART_CHUNKSIZE:
+                part_digests.append(part.digest())
+                part = hashlib.md5()
+                part_filled = 0
+    if part_filled:
+        part_digests.append(part.digest())
+    md5 = whole.hexdigest()
+    if size < MULTIPART_THRESHOLD:
+        return md5, md5
+    return md5, f'{hashlib.md5(b"".join(part_digests)).hexdigest()}-{len(part_digests)}'
+
+
+def default_manifest_path(bucket_name: str, prefix: str) -> str:
+    safe_prefix = prefix.strip('/').replace('/', '_') or 'root'
+    return os.path.join(STATE_DIR, f'upload-{bucket_name}-{safe_prefix}.json')
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """S3 key -> {'path', 'size', 'mtime_ns', 'md5', 'etag'}; empty if missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: str, files: Dict[str, Dict[str, Any]]) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'files': files, 'saved_at': time.time()}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+@dataclass
+class UploadReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    bytes_uploaded: int = 0
+    seconds: float = 0.0
+
+    @property
+    def uploaded(self) -> List[str]:
+        return self.added + self.changed
+
 
-def upload_files_to_s3(folder_path, bucket_name, prefix=""):
-    # Initialize S3 client
-    s3_client = boto3.client('s3')
+class _Progress:
+    """Counts uploaded bytes from transfer callbacks and prints a line every `interval` seconds."""
 
-    # Check if the folder exists
+    def __init__(self, total_files: int, interval: float = 2.0):
+        self.total_files = total_files
+        self.interval = interval
+        self.bytes = 0
+        self.files_done = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+        self._last = self.start
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes += n
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+            line = self._line(now)
+        print(line, flush=True)
+
+    def file_done(self) -> None:
+        with self._lock:
+            self.files_done += 1
+
+    def _line(self, now: float) -> str:
+        elapsed = max(now - self.start, 1e-9)
+        return (f'  {self.files_done}/{self.total_files} files, {self.bytes / MB:.1f} MB, '
+                f'{self.bytes / MB / elapsed:.1f} MB/s')
+
+
+def _remote_etag(s3_client: Any, bucket_name: str, key: str) -> Optional[str]:
+    from botocore.exceptions import ClientError
+
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=key)['ETag'].strip('"')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def upload_files_to_s3(folder_path, bucket_name, prefix="", workers=8, manifest_path=None, verify_etag=False,
+                       force=False, s3_client=None) -> Optional[UploadReport]:
+    """Upload new and changed files under `folder_path` to s3://bucket/prefix; returns what happened."""
     if not os.path.exists(folder_path):
         print(f"Error: The folder '{folder_path}' does not exist.")
-        return
+        return None
+
+    workers = max(1, workers)
+    # Every worker's multipart transfer needs its own connections.
+    s3_client = s3_client or get_client('s3', max_pool_connections=workers * PER_FILE_CONCURRENCY + 4)
+    config = transfer_config()
+    manifest_path = manifest_path or default_manifest_path(bucket_name, prefix)
+    manifest = load_manifest(manifest_path)
+    updated: Dict[str, Dict[str, Any]] = {}
+    report = UploadReport()
+    start = time.monotonic()
 
-    # Walk through the directory
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
+    candidates = []
+    for root, _dirs, files in os.walk(folder_path):
+        for filename in sorted(files):
             local_path = os.path.join(root, filename)
-            
-            # Calculate relative path for S3 key
             relative_path = os.path.relpath(local_path, folder_path)
             s3_key = os.path.join(prefix, relative_path).replace("\\", "/")
+            candidates.append((local_path, relative_path, s3_key))
+    progress = _Progress(len(candidates))
+
+    def process(local_path: str, relative_path: str, s3_key: str) -> Tuple[str, Dict[str, Any], int]:
+        stat = os.stat(local_path)
+        entry = {'path': relative_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        previous = manifest.get(s3_key)
+        if (not force and previous and previous.get('size') == stat.st_size
+                and previous.get('mtime_ns') == stat.st_mtime_ns):
+            # Size and mtime unchanged: trust the recorded digests without re-reading the file.
+            entry.update(md5=previous['md5'], etag=previous['etag'])
+        else:
+            entry['md5'], entry['etag'] = file_digests(local_path)
+
+        unchanged = not force and previous is not None and previous.get('md5') == entry['md5']
+        if not force and (previous is None or verify_etag):
+            # No record of this upload (or asked to double-check): ask S3 what it holds.
+            remote = _remote_etag(s3_client, bucket_name, s3_key)
+            unchanged = remote == entry['etag']
+        if unchanged:
+            return 'unchanged', entry, 0
 
+        s3_client.upload_file(local_path, bucket_name, s3_key, Config=config, Callback=progress.add_bytes)
+        return ('added' if previous is None else 'changed'), entry, stat.st_size
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-upload') as pool:
+        futures = {pool.submit(process, *candidate): candidate for candidate in candidates}
+        for future in as_completed(futures):
+            _local_path, relative_path, s3_key = futures[future]
+            progress.file_done()
             try:
-                # Upload the file to S3
-                s3_client.upload_file(local_path, bucket_name, s3_key)
-                print(f"Successfully uploaded {relative_path} to {bucket_name}/{s3_key}")
-            except ClientError as e:
+                outcome, entry, size = future.result()
+            except Exception as e:
                 print(f"Error uploading {relative_path}: {e}")
+                report.failed.append(s3_key)
+                # Keep the old record so the file is retried, not treated as new, next time.
+                if s3_key in manifest:
+                    updated[s3_key] = manifest[s3_key]
+                continue
+            updated[s3_key] = entry
+            getattr(report, outcome).append(s3_key)
+            report.bytes_uploaded += size
+            if outcome != 'unchanged':
+                print(f"Successfully uploaded {relative_path} to {bucket_name}/{s3_key}")
 
-if __name__ == "__main__":
-    # Folder path (spec-sheets is located next to this script)
-    folder_path = os.path.join(os.path.dirname(__file__), "spec-sheets")
+    save_manifest(manifest_path, updated)
+    report.seconds = time.monotonic() - start
+    rate = report.bytes_uploaded / MB / report.seconds if report.seconds else 0.0
+    print(f"{len(report.added)} added, {len(report.changed)} changed, {len(report.unchanged)} unchanged, "
+          f"{len(report.failed)} failed; {report.bytes_uploaded / MB:.1f} MB in {report.seconds:.1f}s "
+          f"({rate:.1f} MB/s)")
+    return report
 
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    # Folder path (spec-sheets is located next to this script)
+    parser.add_argument('--folder', default=os.path.join(os.path.dirname(__file__), "spec-sheets"))
     # S3 bucket name: use env var UPLOAD_BUCKET_NAME if set, otherwise edit the default
-    bucket_name = os.environ.get("UPLOAD_BUCKET_NAME", "bedrock-kb-975050171524")  # Replace default if needed
+    parser.add_argument('--bucket', default=os.environ.get("UPLOAD_BUCKET_NAME", "bedrock-kb-975050171524"))
+    parser.add_argument('--prefix', default="spec-sheets")
+    parser.add_argument('--workers', type=int, default=8, help='Files uploaded concurrently')
+    parser.add_argument('--manifest', help='Manifest path (default: .kb_state/upload-<bucket>-<prefix>.json)')
+    parser.add_argument('--verify-etag', action='store_true', help='Check unchanged files against the S3 ETag')
+    parser.add_argument('--force', action='store_true', help='Upload every file regardless of the manifest')
+    args = parser.parse_args()
+
+    report = upload_files_to_s3(args.folder, args.bucket, args.prefix, workers=args.workers,
+                                manifest_path=args.manifest, verify_etag=args.verify_etag, force=args.force)
+    if report is None or report.failed:
+        sys.exit(1)
 
-    # S3 prefix (optional)
-    prefix = "spec-sheets"
-    
-    upload_files_to_s3(folder_path, bucket_name, prefix)
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
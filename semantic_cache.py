@@ -0,0 +1,136 @@
+"""Semantic answer cache that sits in front of retrieval + generation.
+
+Prompts are embedded and compared by cosine similarity against previously
+answered prompts for the same knowledge base; a close enough match returns the
+stored answer without touching `query_knowledge_base` or `generate_response`.
+A match also has to name the same equipment models ("X950" vs "BD850"), since
+such prompts embed almost identically but have different answers.
+Entries are held in a preallocated NumPy matrix with LRU eviction, and are
+dropped whenever `kb_sync_state` reports that the KB was re-synced.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from kb_sync_state import sync_generation
+from preclassifier import extract_model_ids
+
+
+class SemanticCache:
+    """In-memory NumPy backend for cached answers keyed by prompt embedding.
+
+    `embed_fn` maps text to a vector (or None on failure, which is treated as a
+    miss). Pass a fake embedder to exercise the cache offline.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], Optional[Sequence[float]]], threshold: float = 0.92,
+                 max_entries: int = 512, generation_fn: Callable[[str], int] = sync_generation):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.generation_fn = generation_fn
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._slots: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._generations: Dict[str, int] = {}
+        # Recent prompt embeddings, so lookup() followed by store() embeds once.
+        self._recent: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+
+    def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._recent.get(prompt)
+        if vec is not None:
+            return vec
+        raw = self.embed_fn(prompt)
+        if raw is None:
+            return None
+        vec = np.asarray(raw, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        vec = vec / norm
+        with self._lock:
+            self._recent[prompt] = vec
+            while len(self._recent) > 32:
+                self._recent.popitem(last=False)
+        return vec
+
+    def _check_generation(self, kb_id: str) -> None:
+        # Caller holds self._lock.
+        current = self.generation_fn(kb_id)
+        if self._generations.get(kb_id, current) != current:
+            self._invalidate_locked(kb_id)
+        self._generations[kb_id] = current
+
+    def _invalidate_locked(self, kb_id: Optional[str]) -> None:
+        for i, entry in enumerate(self._slots):
+            if entry is not None and (kb_id is None or entry['kb_id'] == kb_id):
+                self._slots[i] = None
+                self._last_used[i] = 0.0
+
+    def lookup(self, prompt: str, kb_id: str) -> Optional[str]:
+        """Return a cached answer for a prompt similar to `prompt`, or None."""
+        vec = self._embed(prompt)
+        with self._lock:
+            self._check_generation(kb_id)
+            if vec is None or self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                self.misses += 1
+                return None
+            models = extract_model_ids(prompt)
+            mask = np.array([e is not None and e['kb_id'] == kb_id and e['models'] == models
+                             for e in self._slots])
+            if not mask.any():
+                self.misses += 1
+                return None
+            sims = np.where(mask, self._vectors @ vec, -1.0)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[best] = time.monotonic()
+            return self._slots[best]['answer']
+
+    def store(self, prompt: str, answer: str, kb_id: str) -> None:
+        """Cache `answer` for `prompt`, evicting the least recently used entry when full."""
+        if not answer:
+            return
+        vec = self._embed(prompt)
+        if vec is None:
+            return
+        with self._lock:
+            self._check_generation(kb_id)
+            if self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                # First entry (or a different embedding model): size the matrix to this dimension.
+                self._vectors = np.zeros((self.max_entries, vec.shape[0]), dtype=np.float32)
+                self._slots = [None] * self.max_entries
+                self._last_used[:] = 0.0
+            free = [i for i, e in enumerate(self._slots) if e is None]
+            slot = free[0] if free else int(np.argmin(self._last_used))
+            self._vectors[slot] = vec
+            self._slots[slot] = {'prompt': prompt, 'answer': answer, 'kb_id': kb_id,
+                                 'models': extract_model_ids(prompt)}
+            self._last_used[slot] = time.monotonic()
+
+    def invalidate(self, kb_id: Optional[str] = None) -> None:
+        """Drop cached answers for `kb_id`, or for every KB when omitted."""
+        with self._lock:
+            self._invalidate_locked(kb_id)
+
+    def __len__(self) -> int:
+        return sum(e is not None for e in self._slots)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
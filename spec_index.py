@@ -0,0 +1,343 @@
+"""Structured spec-table index and a local fast path for exact spec lookups.
+
+`extract_spec_records` turns a spec-sheet PDF into normalized
+(model, attribute, value, unit) records: the "Label: value" rows of its
+spec tables (see `ingestion.parse_row`) plus the headline figures on the
+first page. `SpecIndex` keeps them in a dict keyed by (model, attribute) and
+`SpecIndex.resolve` answers questions such as "fuel tank size of the MC750"
+in well under a millisecond, without retrieval or an LLM call.
+
+The resolver only answers when it is sure: the question must name exactly
+one known model, must not ask for comparison or reasoning, every content
+word of the question must be explained by the matched row, and all
+equally good rows must agree on the value. Anything else returns None and
+goes through the normal Bedrock pipeline.
+
+The index is stored as JSON at BEDROCK_SPEC_INDEX (default
+.kb_state/spec_index.json). `load_index` rebuilds it from
+scripts/spec-sheets when it is missing or older than the PDFs; see also
+scripts/build_spec_index.py.
+"""
+import glob
+import json
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from kb_sync_state import STATE_DIR
+from preclassifier import EQUIPMENT_RE, REASONING_RE
+
+SPEC_SHEETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'spec-sheets')
+SPEC_INDEX_PATH = os.environ.get('BEDROCK_SPEC_INDEX', os.path.join(STATE_DIR, 'spec_index.json'))
+INDEX_VERSION = 1
+
+# Section name given to the headline figures printed under a sheet's title.
+HEADLINE_SECTION = 'HEADLINE'
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# Model-id shape in our own sheets' file names and titles ("mobile-crane-mc750", "LE950 ...").
+# Wider than preclassifier.MODEL_ID_RE on purpose: it names new sheets before they are listed there.
+_SHEET_ID_RE = re.compile(r'\b[a-z]{1,3}\d{3,4}\b')
+_PARENS_RE = re.compile(r'\(([^)]*)\)')
+# "Operating Weight: 95,000 kg / 209,439 lb Engine Power: 523 kW / 701 hp" -> two pairs.
+_HEADLINE_PAIR_RE = re.compile(r'([A-Z][A-Za-z ]+?):\s+(.+?)(?=\s+[A-Z][A-Za-z ]+?:\s|$)')
+_QUANTITY_RE = re.compile(r'^(-?\d[\d,]*(?:\.\d+)?)\s*((?:metric |short )?[^\s\d(),/]+(?:/[a-z]+)?)?')
+
+# Label words that qualify rather than name an attribute ("Maximum Speed" is asked as "speed").
+_GENERIC = {'maximum', 'max', 'minimum', 'net', 'overall', 'total', 'number', 'of', 'the', 'at', 'with',
+            'and', 'to', 'on', 'per', 'each', 'standard'}
+# Question words that never need to be explained by the matched row.
+_STOPWORDS = {
+    'what', 'whats', 'which', 'is', 'are', 'was', 'the', 'a', 'an', 'of', 'for', 'on', 'in', 'at', 'to',
+    'its', 'it', 'this', 'that', 'does', 'do', 'did', 'has', 'have', 'how', 'much', 'many', 'me', 'tell',
+    'about', 'give', 'show', 'find', 'can', 'you', 'please', 'there', 'size', 'spec', 'specs',
+    'specification', 'specifications', 'rating', 'rated', 'value', 'figure', 'model', 'machine', 'and',
+    'be', 'get', 'with', 'use', 'uses', 'run', 'runs', 'equipment', 'exactly', 'approximately', 'roughly',
+    'maximum', 'max', 'top', 'total', 'overall', 'net', 'number', 'kg', 'lb', 'lbs', 'pound', 'ton',
+    'tonne', 'metric', 'short', 'liter', 'litre', 'gallon', 'gal', 'meter', 'metre', 'feet', 'foot', 'ft',
+    'mm', 'inch', 'in', 'kw', 'unit', 'imperial',
+}
+# Question word -> the word spec sheets use.
+_SYNONYMS = {
+    'weigh': 'weight', 'weighs': 'weight', 'heavy': 'weight', 'mass': 'weight',
+    'lift': 'lifting', 'lifts': 'lifting', 'horsepower': 'power', 'hp': 'power', 'output': 'power',
+    'fast': 'speed', 'quick': 'speed', 'long': 'length', 'wide': 'width', 'tall': 'height', 'high': 'height',
+    'deep': 'depth', 'tyre': 'tire', 'tyres': 'tire', 'tires': 'tire',
+    'dig': 'digging', 'load': 'payload', 'carry': 'payload', 'hold': 'capacity',
+    'volume': 'capacity',
+}
+
+
+@dataclass
+class SpecRecord:
+    model: str
+    attribute: str
+    label: str
+    section: str
+    value: Union[float, str]
+    unit: str
+    text: str
+    source: str
+    page: int
+
+
+@dataclass
+class SpecAnswer:
+    record: SpecRecord
+    answer: str
+
+
+def normalize_attribute(label: str) -> str:
+    """"Maximum Speed (Forward)" -> "maximum speed forward"."""
+    return ' '.join(_WORD_RE.findall(unicodedata.normalize('NFKC', label).lower()))
+
+
+def parse_quantity(text: str) -> Tuple[Union[float, str], str]:
+    """Return (number, unit) for "11.7 km/h (7.3 mph)"; (text, '') when it does not start with a number."""
+    match = _QUANTITY_RE.match(text)
+    if not match:
+        return text, ''
+    return float(match.group(1).replace(',', '')), (match.group(2) or '').strip()
+
+
+def _record(model: str, label: str, section: str, text: str, source: str, page: int) -> SpecRecord:
+    value, unit = parse_quantity(text)
+    return SpecRecord(model, normalize_attribute(label), label, section, value, unit, text, source, page)
+
+
+def model_from_filename(path: str) -> Optional[str]:
+    match = _SHEET_ID_RE.search(os.path.basename(path).lower())
+    return match.group(0).upper() if match else None
+
+
+def extract_spec_records(pages: Iterable[str], model: str, source: str) -> Tuple[List[SpecRecord], str]:
+    """Return (records, sheet title) for one spec sheet's page texts."""
+    from ingestion import iter_lines, parse_row
+
+    records: List[SpecRecord] = []
+    title = ''
+    in_specs = False
+    headline: Optional[Tuple[int, str]] = None
+    for page, kind, section, line in iter_lines(pages):
+        if headline is not None:
+            # The headline line is often wrapped mid-figure ("Engine Power: 2,610" / "kW / 3,500 hp").
+            text = headline[1] + (' ' + line if kind == 'text' and headline[1][-1] in '0123456789' else '')
+            for label, value in _HEADLINE_PAIR_RE.findall(text):
+                records.append(_record(model, label.strip(), HEADLINE_SECTION, value.strip(), source, headline[0]))
+            headline = None
+        if kind == 'heading':
+            title = title or line
+            in_specs = in_specs or line.startswith('TECHNICAL SPECIFICATIONS')
+            continue
+        if kind != 'table':
+            continue
+        if section == title and not records:
+            headline = (page, line)
+            continue
+        label, value = parse_row(line)
+        # Before the spec tables, only rows with figures are specs ("Advanced Telematics: ..." is not).
+        if in_specs or value[0].isdigit():
+            records.append(_record(model, label, section.replace('TECHNICAL SPECIFICATIONS ', ''), value,
+                                   source, page))
+    return records, title
+
+
+def build_index(folder: str = SPEC_SHEETS_DIR) -> 'SpecIndex':
+    """Extract every spec sheet under `folder` whose file name contains a model id."""
+    from ingestion import iter_pdf_pages
+
+    models: Dict[str, Dict[str, Any]] = {}
+    records: List[SpecRecord] = []
+    for path in sorted(glob.glob(os.path.join(folder, '**', '*.pdf'), recursive=True)):
+        model = model_from_filename(path)
+        if model is None:
+            continue
+        source = os.path.relpath(path, folder).replace('\\', '/')
+        sheet_records, title = extract_spec_records(iter_pdf_pages(path), model, source)
+        # "LE950 LARGE EXCAVATOR" in excavator-x950-spec-sheet.pdf: the title's id is an alias.
+        title_id = _SHEET_ID_RE.search(title.lower())
+        aliases = sorted({model.lower(), title_id.group(0)} if title_id else {model.lower()})
+        equipment = EQUIPMENT_RE.search(os.path.basename(path).lower().replace('-', ' '))
+        models[model] = {
+            'title': title,
+            'aliases': aliases,
+            'equipment': equipment.group(0) if equipment else '',
+            'source': source,
+        }
+        records.extend(sheet_records)
+    return SpecIndex(models, records)
+
+
+def _tokens(text: str, drop: Set[str] = _STOPWORDS) -> Set[str]:
+    """Words of `text` not in `drop`, mapped to spec-sheet vocabulary and crudely singularized."""
+    out = set()
+    for word in _WORD_RE.findall(unicodedata.normalize('NFKC', text).lower()):
+        if word in drop:
+            continue
+        word = _SYNONYMS.get(word, word)
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        out.add(_SYNONYMS.get(word, word))
+    return out
+
+
+class SpecIndex:
+    """Spec records keyed by (model, attribute), with a question resolver; see the module docstring."""
+
+    def __init__(self, models: Dict[str, Dict[str, Any]], records: Sequence[SpecRecord]):
+        self.models = models
+        self.records: Dict[Tuple[str, str], SpecRecord] = {}
+        self._by_model: Dict[str, List[Tuple[SpecRecord, Set[str], Set[str]]]] = {}
+        for record in records:
+            # Headline figures repeat a spec-table row under a shorter label; the table row wins.
+            key = (record.model, record.attribute)
+            if key in self.records and record.section == HEADLINE_SECTION:
+                continue
+            self.records[key] = record
+        for record in self.records.values():
+            qualifiers = ' '.join(_PARENS_RE.findall(record.label))
+            label_words = _tokens(_PARENS_RE.sub(' ', record.label), _GENERIC)
+            # The section's own parenthetical ("DIMENSIONS (with SU Blade ...)") is not about this row.
+            context_words = _tokens(f"{qualifiers} {_PARENS_RE.sub(' ', record.section)}", _GENERIC)
+            self._by_model.setdefault(record.model, []).append((record, label_words, context_words))
+        self._aliases: List[Tuple[re.Pattern, str]] = []
+        self._model_words: Dict[str, Set[str]] = {}
+        equipment_counts: Dict[str, int] = {}
+        for info in models.values():
+            if info.get('equipment'):
+                equipment_counts[info['equipment']] = equipment_counts.get(info['equipment'], 0) + 1
+        for model, info in models.items():
+            names = list(info.get('aliases') or [model.lower()])
+            # "the forklift" only identifies a model when the corpus has one forklift.
+            if info.get('equipment') and equipment_counts[info['equipment']] == 1:
+                names.append(info['equipment'])
+            for name in names:
+                self._aliases.append((re.compile(r'\b' + re.escape(name) + r's?\b'), model))
+            self._model_words[model] = _tokens(' '.join(names))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get(self, model: str, attribute: str) -> Optional[SpecRecord]:
+        return self.records.get((model.upper(), normalize_attribute(attribute)))
+
+    def find_models(self, text: str) -> Set[str]:
+        lowered = unicodedata.normalize('NFKC', text or '').lower()
+        return {model for pattern, model in self._aliases if pattern.search(lowered)}
+
+    def match(self, question: str, context: Optional[str] = None) -> Optional[SpecRecord]:
+        """Return the single row `question` asks for, or None when unsure.
+
+        `context` (e.g. the standalone query of a follow-up) is only used to
+        find the model when the question itself names none.
+        """
+        text = (question or '').lower()
+        if not text.strip() or REASONING_RE.search(text):
+            return None
+        models = self.find_models(text) or (self.find_models(context) if context else set())
+        if len(models) != 1:
+            return None
+        model = models.pop()
+        asked = _tokens(text) - self._model_words[model]
+        if not asked:
+            return None
+
+        best: List[Tuple[Tuple[int, int, int], SpecRecord]] = []
+        for record, label_words, context_words in self._by_model.get(model, ()):
+            matched = asked & label_words
+            if not matched:
+                continue
+            # Every content word of the question must be accounted for by this row.
+            if asked - label_words - context_words:
+                continue
+            score = (int(label_words <= asked), len(matched), len(asked & context_words))
+            if not best or score > best[0][0]:
+                best = [(score, record)]
+            elif score == best[0][0]:
+                best.append((score, record))
+        if not best:
+            return None
+        # Headline figures repeat fully matched table rows in other units; prefer the table row.
+        if best[0][0][0] and any(record.section != HEADLINE_SECTION for _, record in best):
+            best = [(score, record) for score, record in best if record.section != HEADLINE_SECTION]
+        values = {(record.value, record.unit) for _, record in best}
+        return best[0][1] if len(values) == 1 else None
+
+    def resolve(self, question: str, context: Optional[str] = None) -> Optional[SpecAnswer]:
+        record = self.match(question, context)
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            return None
+        info = self.models.get(record.model, {})
+        title = info.get('title', '').title()
+        name = f'{record.model} ({title})' if title else record.model
+        section = '' if record.section == HEADLINE_SECTION else f' [{record.section.title()}]'
+        answer = (f'**{record.label}** of the {name}: {record.text}\n\n'
+                  f'_Source: {record.source}, page {record.page}{section}._')
+        return SpecAnswer(record, answer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'records': len(self.records), 'models': len(self.models), 'hits': self.hits,
+                    'misses': self.misses}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': INDEX_VERSION, 'models': self.models,
+                'records': [asdict(record) for record in self.records.values()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SpecIndex':
+        return cls(data.get('models', {}), [SpecRecord(**record) for record in data.get('records', [])])
+
+    def save(self, path: str = SPEC_INDEX_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SPEC_INDEX_PATH) -> 'SpecIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f'unsupported spec index version {data.get("version")}')
+        return cls.from_dict(data)
+
+
+def _is_stale(path: str, folder: str) -> bool:
+    try:
+        built = os.stat(path).st_mtime
+    except OSError:
+        return True
+    return any(os.stat(pdf).st_mtime > built
+               for pdf in glob.glob(os.path.join(folder, '**', '*.pdf'), recursive=True))
+
+
+def load_index(path: str = SPEC_INDEX_PATH, folder: str = SPEC_SHEETS_DIR) -> SpecIndex:
+    """Load the saved index, rebuilding it first if the spec sheets are newer.
+
+    Returns an empty index (every lookup misses) when it can be neither
+    loaded nor built, e.g. without pypdf installed.
+    """
+    try:
+        if os.path.isdir(folder) and _is_stale(path, folder):
+            index = build_index(folder)
+            index.save(path)
+            return index
+        return SpecIndex.load(path)
+    except Exception as e:
+        print(f"Spec index unavailable ({path}): {e}")
+        return SpecIndex({}, [])
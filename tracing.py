@@ -0,0 +1,236 @@
+"""Lightweight tracing spans with an OpenTelemetry-compatible API.
+
+Instrumented code calls `get_tracer().start_as_current_span(name, attributes=...)`
+(or `start_span` for spans that outlive a `with` block, such as a stream) and
+uses the span's `set_attribute`, `set_attributes`, `add_event`,
+`record_exception` and `end`, the same subset of the OpenTelemetry API. The
+active tracer is chosen by BEDROCK_TRACING:
+
+  none   no-op spans, the default; costs about a microsecond per span
+  local  in-process tracer; finished spans go to `recent_traces` and, when
+         BEDROCK_TRACE_FILE is set, one JSON object per line to that file
+  otel   the real `opentelemetry` tracer (install and configure the SDK yourself)
+
+Setting BEDROCK_TRACE_FILE alone implies `local`. The current span is kept in
+a contextvar, so work handed to a thread pool joins the caller's trace when it
+is submitted through `contextvars.copy_context().run`.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+    def end(self) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class NoopTracer:
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                              **kwargs: Any) -> Iterator[_NoopSpan]:
+        yield _NOOP_SPAN
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None, **kwargs: Any) -> _NoopSpan:
+        return _NOOP_SPAN
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('bedrock_current_span', default=None)
+
+
+class Span:
+    """A finished-on-`end` span of the local tracer."""
+
+    def __init__(self, tracer: 'LocalTracer', name: str, parent: Optional['Span'],
+                 attributes: Optional[Dict[str, Any]]):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f'{random.getrandbits(128):032x}'
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = 'OK'
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append({'name': name, 'time': time.time(), 'attributes': dict(attributes or {})})
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.status = 'ERROR'
+        self.add_event('exception', {'exception.type': type(exception).__name__,
+                                     'exception.message': str(exception)})
+
+    def is_recording(self) -> bool:
+        return self.duration_ms is None
+
+    def end(self) -> None:
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._start) * 1000.0
+            self._tracer._export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_time': self.start_time,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes,
+            'events': self.events,
+        }
+
+
+class JsonlExporter:
+    """Appends each finished span to `path` as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+class RecentTraces:
+    """Keeps the spans of the last `max_traces` traces in memory."""
+
+    def __init__(self, max_traces: int = 20):
+        self.max_traces = max_traces
+        self._traces: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            spans = self._traces.setdefault(span['trace_id'], [])
+            self._traces.move_to_end(span['trace_id'])
+            spans.append(span)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def trace(self, trace_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._traces.get(trace_id, ()))
+
+
+class LocalTracer:
+    def __init__(self, exporters: List[Any]):
+        self.exporters = exporters
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Span:
+        return Span(self, name, _current_span.get(), attributes)
+
+    @contextmanager
+    def start_as_current_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                              **kwargs: Any) -> Iterator[Span]:
+        span = self.start_span(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _export(self, span: Span) -> None:
+        record = span.to_dict()
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                print(f"Error exporting span: {e}")
+
+
+recent_traces = RecentTraces()
+_tracer: Any = None
+_lock = threading.Lock()
+
+
+def configure(mode: Optional[str] = None, path: Optional[str] = None) -> Any:
+    """Select the active tracer; arguments default to BEDROCK_TRACING / BEDROCK_TRACE_FILE."""
+    global _tracer
+    path = path if path is not None else os.environ.get('BEDROCK_TRACE_FILE')
+    mode = mode or os.environ.get('BEDROCK_TRACING') or ('local' if path else 'none')
+    if mode == 'none':
+        tracer: Any = NoopTracer()
+    elif mode == 'local':
+        tracer = LocalTracer([recent_traces] + ([JsonlExporter(path)] if path else []))
+    elif mode == 'otel':
+        from opentelemetry import trace
+        tracer = trace.get_tracer('bedrock-chat')
+    else:
+        raise ValueError(f'Unknown tracing mode: {mode!r}')
+    with _lock:
+        _tracer = tracer
+    return tracer
+
+
+def get_tracer() -> Any:
+    """The active tracer; look it up per call so `configure` can switch it at runtime."""
+    return _tracer if _tracer is not None else configure()
+
+
+def is_local() -> bool:
+    return isinstance(get_tracer(), LocalTracer)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def span_tree(spans: List[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """Order a trace's spans depth-first by start time as (depth, span) pairs."""
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {span['span_id'] for span in spans}
+    for span in spans:
+        # Spans whose parent is not in this list are shown as roots.
+        parent = span['parent_id'] if span['parent_id'] in ids else None
+        children.setdefault(parent, []).append(span)
+    ordered: List[Tuple[int, Dict[str, Any]]] = []
+
+    def walk(parent_id: Optional[str], depth: int) -> None:
+        for span in sorted(children.get(parent_id, ()), key=lambda s: s['start_time']):
+            ordered.append((depth, span))
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+    return ordered